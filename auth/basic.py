@@ -20,13 +20,68 @@
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
 # THE SOFTWARE.
 
+import hashlib
+
 from django.http import HttpResponse
+from django.core.cache import cache
 from django.contrib.auth.models import User
+from django.db.models.signals import post_save, post_delete
+from django.utils.encoding import smart_str
 from django.utils.translation import ugettext as _
 
 from wapi.auth.base import ApiAuth
+from wapi.caching import CACHE_PREFIX
+from wapi.utils import get_signature
+
+# Fingerprints should outlive any cached verification
+FINGERPRINT_TIMEOUT = 60 * 60 * 24
+
+def get_credentials_key(username, password):
+    """Returns the cache key for a verification of the given credentials,
+    a keyed hash so the password can't be recovered from it"""
+    return '%s:auth:%s' % (CACHE_PREFIX,
+        get_signature(smart_str('%s:%s' % (username, password)), 'wapi.auth'))
+
+def get_fingerprint_key(username):
+    """Returns the cache key which stores the fingerprint of a user"""
+    return '%s:auth:user:%s' % (CACHE_PREFIX,
+        hashlib.md5(smart_str(username)).hexdigest())
+
+def get_fingerprint(user):
+    """Returns a value which changes when any field of the user changes,
+    so a cached user is never served with stale values"""
+    values = [repr(getattr(user, field.attname)) for field in user._meta.fields]
+    return get_signature(smart_str(':'.join(values)), 'wapi.auth.user')
+
+def update_fingerprint(sender, instance, **kwargs):
+    cache.set(get_fingerprint_key(instance.username), get_fingerprint(instance),
+        FINGERPRINT_TIMEOUT)
+
+def delete_fingerprint(sender, instance, **kwargs):
+    cache.delete(get_fingerprint_key(instance.username))
+
+def connect_fingerprint_signals():
+    """Keeps the fingerprints updated when users are saved or deleted.
+    Called when an ApiAuthBasic with credentials_cache_ttl is created,
+    so there's no overhead unless the cache is used"""
+    post_save.connect(update_fingerprint, sender=User,
+        dispatch_uid='wapi.auth.basic.update_fingerprint')
+    post_delete.connect(delete_fingerprint, sender=User,
+        dispatch_uid='wapi.auth.basic.delete_fingerprint')
 
 class ApiAuthBasic(ApiAuth):
+    # Seconds a successful verification is cached, 0 disables the cache.
+    # Cached verifications are discarded when the user is saved, unless
+    # it's saved by a process which hasn't created an ApiAuthBasic with
+    # the cache enabled. Username changes are only noticed when they expire.
+    credentials_cache_ttl = 0
+    # Seconds a failed verification is cached, when the cache is enabled
+    failed_credentials_cache_ttl = 10
+
+    def __init__(self):
+        if self.credentials_cache_ttl:
+            connect_fingerprint_signals()
+
     def check_password(self, request, realm, user, password):
         """Override this and implement the logic for your authentication
         method. You are supposed to return True if authentication
@@ -37,12 +92,15 @@ class ApiAuthBasic(ApiAuth):
         """Implements the logic for authentication"""
         username, password = self.get_credentials(request)
         if username and password:
-            try:
-                user = User.objects.get(username=username)
-            except User.DoesNotExist:
-                return None
+            if self.credentials_cache_ttl:
+                user, verified = self.get_cached_verification(request,
+                    username, password)
+            else:
+                user, verified = self.verify(request, username, password)
 
-            if user.is_active and self.check_password(request, self.__class__.realm, user, password):
+            if user is None:
+                return None
+            if verified:
                 request.user = user
                 return None
 
@@ -50,6 +108,43 @@ class ApiAuthBasic(ApiAuth):
 
         return None
 
+    def verify(self, request, username, password):
+        """Returns the user with the given username, or None if there's
+        none, and wheter the password is valid"""
+        try:
+            user = User.objects.get(username=username)
+        except User.DoesNotExist:
+            return None, False
+
+        return user, user.is_active and \
+            self.check_password(request, self.__class__.realm, user, password)
+
+    def get_cached_verification(self, request, username, password):
+        """Like verify, but uses the result cached for the same credentials
+        if the user hasn't changed since it was stored. A hit costs a single
+        cache round trip"""
+        key = get_credentials_key(username, password)
+        fingerprint_key = get_fingerprint_key(username)
+        cached = cache.get_many([key, fingerprint_key])
+        entry = cached.get(key)
+        if entry is not None and entry[0] == cached.get(fingerprint_key):
+            return entry[1], entry[2]
+
+        user, verified = self.verify(request, username, password)
+        fingerprint = None
+        if user is not None:
+            fingerprint = get_fingerprint(user)
+            cache.set(fingerprint_key, fingerprint, FINGERPRINT_TIMEOUT)
+
+        if verified:
+            ttl = self.credentials_cache_ttl
+        else:
+            ttl = self.failed_credentials_cache_ttl
+        if ttl:
+            cache.set(key, (fingerprint, user, verified), ttl)
+
+        return user, verified
+
     def authentication_failed(self, request):
         """Returns a response indicating the provided credentials were wrong.
         According to http://en.wikipedia.org/wiki/HTTP_401#4xx_Client_Error the
@@ -59,7 +154,6 @@ class ApiAuthBasic(ApiAuth):
     def get_credentials(self, request):
         """Utility function for getting the authentication credentials"""
         if 'HTTP_AUTHORIZATION' in request.META:
-            print request.META['HTTP_AUTHORIZATION']
             meth, auth = request.META['HTTP_AUTHORIZATION'].split(' ', 1)
             if meth.lower() == 'basic':
                 decoded = auth.decode('base64')
@@ -20,13 +20,16 @@
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
 # THE SOFTWARE.
 
+import time
+import hashlib
+
 from django.http import HttpResponse
+from django.core.cache import cache
 from django.utils.translation import ugettext as _
 from django.contrib.auth.models import User
 from wapi.auth.base import ApiAuth
-from bynotes.digest.models import Challenge, Cnonce
-
-import hashlib
+from wapi.caching import CACHE_PREFIX
+from wapi.utils import get_signature, constant_time_compare
 
 def split_into_dict(value, sep=','):
     dct = {}
@@ -35,69 +38,135 @@ def split_into_dict(value, sep=','):
         dct[key] = value.strip('"')
     return dct
 
+def get_HA2(method, uri):
+    return hashlib.md5('%s:%s' % (method, uri)).hexdigest()
+
+def get_digest(ha1, nonce, nc, cnonce, qop, ha2):
+    """Returns the request digest as per RFC 2617"""
+    return hashlib.md5('%s:%s:%s:%s:%s:%s' % (ha1, nonce, nc, cnonce, qop,
+        ha2)).hexdigest()
+
+def make_nonce(realm, timestamp=None):
+    """Returns a nonce containing its creation time, signed so it can be
+    validated without storing it"""
+    timestamp = '%x' % int(timestamp or time.time())
+    return timestamp + get_signature('%s:%s' % (timestamp, realm),
+        'wapi.auth.digest')
+
+def get_nonce_time(realm, nonce):
+    """Returns the time when the nonce was created, or None if it
+    wasn't created by make_nonce for the same realm"""
+    timestamp, signature = nonce[:-40], nonce[-40:]
+    expected = get_signature('%s:%s' % (timestamp, realm), 'wapi.auth.digest')
+    if not timestamp or not constant_time_compare(signature, expected):
+        return None
+
+    try:
+        return int(timestamp, 16)
+    except ValueError:
+        return None
+
 class ApiAuthDigest(ApiAuth):
     realm = ''
+    # Seconds a nonce is valid, clients get a new one when it expires
+    nonce_ttl = 300
+    # Number of HA1 values kept in memory
+    ha1_cache_size = 1000
+    # Seconds an HA1 value is kept in memory
+    ha1_cache_ttl = 300
+
     def get_HA1(self, request, realm, user):
         """This should return hashlib.md5(username:realm:password).hexdigest()"""
         raise NotImplementedError
 
+    def get_cached_HA1(self, request, realm, user):
+        """Like get_HA1, but keeps the values in memory. They're discarded
+        when the password of the user changes or after ha1_cache_ttl"""
+        ha1_cache = self.__dict__.setdefault('_ha1_cache', {})
+        key = (user.username, user.password, realm)
+        now = time.time()
+        try:
+            ha1, expires = ha1_cache[key]
+            if expires > now:
+                return ha1
+        except KeyError:
+            pass
+
+        if len(ha1_cache) >= self.ha1_cache_size:
+            ha1_cache.clear()
+        ha1 = self.get_HA1(request, realm, user)
+        ha1_cache[key] = (ha1, now + self.ha1_cache_ttl)
+        return ha1
+
+    def register_nc(self, nonce, cnonce, nc):
+        """Returns True if the nonce count hasn't been used before with the
+        nonce and the client nonce, False if the request is a replay. Used
+        counts are remembered in the cache while the nonce is valid"""
+        key = '%s:digest:%s' % (CACHE_PREFIX,
+            hashlib.md5('%s:%s:%s' % (nonce, cnonce, nc)).hexdigest())
+        return bool(cache.add(key, 1, self.nonce_ttl))
+
     def login(self, request):
         if 'HTTP_AUTHORIZATION' in request.META:
             meth, auth = request.META['HTTP_AUTHORIZATION'].strip().split(' ', 1)
             if meth.lower() == 'digest':
                 params = split_into_dict(auth)
-                if self.__class__.realm != params.get('realm'):
+                realm = self.__class__.realm
+                if realm != params.get('realm'):
                     return self.login_required(request)
 
                 if request.get_full_path() != params.get('uri'):
                     return self.login_required(request)
 
                 try:
-                    challenge = Challenge.objects.get(opaque=params['opaque'])
+                    nonce = params['nonce']
+                    nc = params['nc']
+                    cnonce = params['cnonce']
                     user = User.objects.get(username=params['username'])
-                except (KeyError, Challenge.DoesNotExist, User.DoesNotExist):
-                    return self.login_required(request)
-
-                if challenge.nonce != params.get('nonce'):
+                except (KeyError, User.DoesNotExist):
                     return self.login_required(request)
 
-                if not challenge.validate_nc(params.get('nc')):
+                created = get_nonce_time(realm, nonce)
+                if created is None:
                     return self.login_required(request)
 
-                ha1 = self.get_HA1(request, self.__class__.realm, user)
-                ha2 = hashlib.md5('%s:%s' % (request.method, request.get_full_path())).hexdigest()
-                ha = hashlib.md5('%s:%s:%s:%s:%s:%s' % (ha1, challenge.nonce,
-                    params.get('nc'), params.get('cnonce'), 'auth', ha2)).hexdigest()
+                ha1 = self.get_cached_HA1(request, realm, user)
+                ha = get_digest(ha1, nonce, nc, cnonce, 'auth',
+                    get_HA2(request.method, params['uri']))
 
-                if ha != params.get('response'):
+                if not constant_time_compare(ha, params.get('response', '')):
                     return self.login_required(request)
 
-                cnonce, cr = Cnonce.objects.get_or_create(challenge=challenge, cnonce=params.get('cnonce'))
-                if not cr:
-                    return self.stale(request, challenge)
+                # Right credentials, but the client must retry with a new
+                # nonce if it expired or the request is a replay
+                if created + self.nonce_ttl < time.time() or \
+                    not self.register_nc(nonce, cnonce, nc):
+                    return self.stale(request)
 
                 request.user = user
 
         return None
 
-    def stale(self, request, challenge):
-        """Returned when the cnonce has been used"""
+    def get_opaque(self):
+        return get_signature(self.__class__.realm, 'wapi.auth.digest.opaque')
+
+    def challenge(self, request, stale=False):
+        """Returns a 401 response with a new nonce"""
         response = HttpResponse(_('Authorization Required'), mimetype='text/plain')
-        response['WWW-Authenticate'] = 'Digest realm="%s",qop="auth",nonce="%s",opaque="%s",stale="true"' % \
-            (self.__class__.realm, challenge.nonce, challenge.opaque)
+        response['WWW-Authenticate'] = 'Digest realm="%s",qop="auth",nonce="%s",opaque="%s"' % \
+            (self.__class__.realm, make_nonce(self.__class__.realm),
+            self.get_opaque())
+        if stale:
+            response['WWW-Authenticate'] += ',stale="true"'
 
         response.status_code = 401
         return response
 
+    def stale(self, request):
+        """Returned when the nonce has expired or has been used"""
+        return self.challenge(request, stale=True)
+
     def login_required(self, request):
         """Return a response with the params the client needs to perform
         digest authentication"""
-
-        challenge = Challenge.objects.create()
-        response = HttpResponse(_('Authorization Required'), mimetype='text/plain')
-        response['WWW-Authenticate'] = 'Digest realm="%s",qop="auth",nonce="%s",opaque="%s"' % \
-            (self.__class__.realm, challenge.nonce, challenge.opaque)
-
-        response.status_code = 401
-        return response
-
+        return self.challenge(request)
@@ -23,15 +23,29 @@
 """Different bindings for Wapi. This version only includes ReST"""
 
 from copy import copy
+from traceback import format_exc
+from types import GeneratorType
 
-from django.http import Http404
+try:
+    from django.utils import simplejson
+except ImportError:
+    import simplejson
+
+from django.http import Http404, HttpResponse, HttpResponseNotModified, \
+    QueryDict
 from django.conf import settings
 
-from wapi.responses import get_response
-from wapi.formatters import UnknownFormat
-from wapi.exceptions import ApiError, ApiLoginRequired
+from wapi.responses import get_response, compress_response, \
+    StreamingSerializableResponse
+from wapi.formatters import UnknownFormat, get_formatter
+from wapi.exceptions import ApiError, ApiLoginRequired, ApiBadRequest
 from wapi.function import ApiFunction
-from wapi.utils import api_iterate, get_instance
+from wapi.parameters import ParameterView
+from wapi.caching import get_cache_key, get_cached_response, \
+    cache_response, resolve_tags, invalidate_tags
+from wapi.utils import api_iterate, get_instance, get_etag, etag_matches, \
+    params_repr, to_timestamp, http_date, parse_http_date, run_concurrently, \
+    parse_fieldsets, prime
 
 class Binding(object):
     """Base class for all Wapi bindings"""
@@ -60,12 +74,19 @@ class Binding(object):
             raise Http404('Method "%s" not found' % method_name)
 
 class RestBinding(Binding):
-    """Exposes an API trough ResT"""
+    """Exposes an API trough ResT. POSTing to BATCH_NAME performs multiple
+    calls in the same request, see batch()"""
     PATTERN = '(?P<method_name>.*)\.(?P<format>\w+)'
     READ_WRITE_MAPPING = {
         'GET': 'read',
+        'HEAD': 'read',
         'POST': 'write',
     }
+    BATCH_NAME = 'batch'
+    BATCH_MAX_CALLS = 50
+    # Number of threads used for running the read calls which precede the
+    # first write in a batch concurrently, 0 runs every call sequentially
+    BATCH_WORKERS = 0
     def __init__(self, api, auth=None):
         super(RestBinding, self).__init__(api)
         self.auth = get_instance(auth)
@@ -86,21 +107,268 @@ class RestBinding(Binding):
         except UnknownFormat:
             raise Http404('No registered serializer for format "%s"' % format)
 
+        if method_name == self.BATCH_NAME and request.method == 'POST' and \
+            method_name not in self.registry['write']:
+            return self.batch(request, format, response_cls)
+
         try:
             method = self.get_method(self.READ_WRITE_MAPPING[request.method],
                 method_name)
         except KeyError:
             raise Http404('Method "%s" not found' % method_name)
 
+        if request.method == 'POST':
+            dct = ParameterView(request.POST)
+        else:
+            dct = ParameterView(request.GET)
+
         try:
-            if request.method == 'POST':
-                response = method(request, copy(request.POST))
-            else:
-                response = method(request, copy(request.GET))
+            method.validate(request, dct)
+            validators = self.get_validators(request, method, dct, format)
+            not_modified = self.get_not_modified(request, validators)
+            if not_modified:
+                return not_modified
+            response = self.call_method(request, method, dct, format,
+                response_cls, validators)
         except ApiLoginRequired:
             return self.auth.login_required(request)
         except ApiError, e:
             return e.get_response()
 
+        return self.finish_response(request, response)
+
+    def call_method(self, request, method, dct, format, response_cls,
+        validators=None):
+        """Calls the method with the already validated parameters and
+        returns its serialized response, using the cache if possible"""
+        cache_key = None
+        if self.is_cacheable(request, method):
+            cache_key = get_cache_key(method, request, dct, format)
+            response = get_cached_response(cache_key)
+            if response:
+                return response
+
+        response = method.func(request, dct)
+        if isinstance(response, GeneratorType):
+            # Run the generator up to its first yield, so errors raised
+            # before it are still reported as usual
+            response = StreamingSerializableResponse(prime(response))
         response.kwargs['request'] = request
-        return response.transform(response_cls)
+        if method.accepts_fieldsets:
+            fieldsets = parse_fieldsets(dct)
+            if fieldsets:
+                response.kwargs['fields'] = fieldsets
+        response = response.transform(response_cls)
+        for header, value in (validators or {}).items():
+            response[header] = value
+        self.set_etag(request, response)
+        if cache_key:
+            cache_response(cache_key, response, method.cache.ttl)
+        if request.method == 'POST' and method.invalidates:
+            invalidate_tags(resolve_tags(method.invalidates, request, dct))
+        return response
+
+    def batch(self, request, format, response_cls):
+        """Performs the calls in the 'calls' parameter, which must be a JSON
+        list of objects like {"method": "name", "verb": "GET", "params": {}}.
+        verb defaults to GET. Returns a list with the status and the body of
+        every call, formatted in the requested format. Errors in a call
+        are reported in its status and body."""
+        try:
+            calls = simplejson.loads(request.POST['calls'])
+        except (KeyError, ValueError):
+            return ApiBadRequest('Invalid or missing "calls" parameter').get_response()
+
+        if not isinstance(calls, list):
+            return ApiBadRequest('"calls" must be a list').get_response()
+        if len(calls) > self.BATCH_MAX_CALLS:
+            return ApiBadRequest('Too many calls (max is %d)' % \
+                self.BATCH_MAX_CALLS).get_response()
+
+        results = [None] * len(calls)
+        reads = []
+        def perform(index):
+            results[index] = self.batch_call(request, calls[index], format,
+                response_cls)
+        def perform_reads():
+            run_concurrently([lambda i=i: perform(i) for i in reads],
+                self.BATCH_WORKERS)
+            del reads[:]
+
+        # Worker threads use their own database connections, so they
+        # can't see uncommitted writes made by this thread (e.g. with
+        # TransactionMiddleware). Only the reads before the first write
+        # run concurrently, the rest of the calls run in order here.
+        wrote = False
+        for index, call in enumerate(calls):
+            is_read = self.get_batch_verb(call) in ('GET', 'HEAD')
+            if self.BATCH_WORKERS and is_read and not wrote:
+                reads.append(index)
+            else:
+                perform_reads()
+                perform(index)
+                wrote = wrote or not is_read
+        perform_reads()
+
+        fmt = get_formatter(format)()
+        fmt.start()
+        fmt.format_list([('call', result) for result in results])
+        fmt.end()
+        response = HttpResponse(fmt.get(), content_type=response_cls.content_type)
+        return self.finish_response(request, response)
+
+    def get_batch_verb(self, call):
+        """Returns the HTTP method used for one of the calls in a batch"""
+        try:
+            return call.get('verb', 'GET').upper()
+        except AttributeError:
+            return None
+
+    def batch_call(self, request, call, format, response_cls):
+        """Performs one of the calls in a batch, returning a dict with
+        its status and its body"""
+        verb = self.get_batch_verb(call)
+        if verb not in self.READ_WRITE_MAPPING or 'method' not in call or \
+            not isinstance(call.get('params') or {}, dict):
+            return self.batch_result(call,
+                ApiBadRequest('Invalid call').get_response())
+
+        try:
+            method = self.get_method(self.READ_WRITE_MAPPING[verb],
+                call['method'])
+        except Http404, e:
+            response = HttpResponse(str(e))
+            response.status_code = 404
+            return self.batch_result(call, response)
+
+        dct = QueryDict('').copy()
+        for key, value in (call.get('params') or {}).items():
+            if isinstance(value, list):
+                dct.setlist(key, [unicode(v) for v in value])
+            else:
+                dct[key] = unicode(value)
+
+        # Every call gets its own request, with its method and parameters
+        call_request = copy(request)
+        call_request.method = verb
+        if verb == 'POST':
+            call_request.POST = dct
+        else:
+            call_request.GET = dct
+
+        try:
+            method.validate(call_request, dct)
+            response = self.call_method(call_request, method, dct, format,
+                response_cls)
+        except ApiError, e:
+            response = e.get_response()
+        except Http404, e:
+            response = HttpResponse(str(e))
+            response.status_code = 404
+        except Exception, e:
+            # Errors in a call must not fail the whole batch
+            if settings.DEBUG:
+                response = HttpResponse(format_exc())
+            else:
+                response = HttpResponse('Internal server error')
+            response.status_code = 500
+
+        return self.batch_result(call, response)
+
+    def batch_result(self, call, response):
+        """Returns the result included in a batch response for a call"""
+        try:
+            method_name = call.get('method')
+        except AttributeError:
+            method_name = None
+
+        return {
+            'method': method_name,
+            'status': response.status_code,
+            'body': response.content,
+        }
+
+    def set_etag(self, request, response):
+        """Adds an ETag computed from the content to successful read
+        responses. Streamed responses are left alone, since computing
+        it would require consuming them"""
+        if self.READ_WRITE_MAPPING[request.method] != 'read' or \
+            response.status_code != 200 or \
+            getattr(response, 'streaming', False) or \
+            response.has_header('ETag'):
+            return
+
+        response['ETag'] = get_etag(response.content)
+
+    def get_validators(self, request, method, dct, format):
+        """Returns the ETag and Last-Modified headers for the call when the
+        function declares how to compute them without running it"""
+        validators = {}
+        if self.READ_WRITE_MAPPING[request.method] != 'read' or \
+            not self.may_bypass(request, method):
+            return validators
+
+        if method.version_key:
+            version = method.version_key(request, dct)
+            if version is not None:
+                validators['ETag'] = get_etag('\0'.join([method.name, format,
+                    params_repr(dct), unicode(version).encode('utf8')]))
+
+        if method.last_modified:
+            modified = method.last_modified(request, dct)
+            if modified is not None:
+                validators['Last-Modified'] = http_date(to_timestamp(modified))
+
+        return validators
+
+    def get_not_modified(self, request, validators):
+        """Returns a 304 carrying the given validators if the client already
+        has the current response, None otherwise"""
+        etag = validators.get('ETag')
+        if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+        if if_none_match:
+            # If-Modified-Since must be ignored when If-None-Match is present
+            if not etag or not etag_matches(etag, if_none_match):
+                return None
+        else:
+            last_modified = parse_http_date(validators.get('Last-Modified'))
+            if_modified_since = parse_http_date(
+                request.META.get('HTTP_IF_MODIFIED_SINCE'))
+            if last_modified is None or if_modified_since is None or \
+                last_modified > if_modified_since:
+                return None
+
+        response = HttpResponseNotModified()
+        for header, value in validators.items():
+            response[header] = value
+        return response
+
+    def finish_response(self, request, response):
+        """Returns a 304 if the client already has the response, otherwise
+        compresses it and strips the body from responses to HEAD requests"""
+        validators = dict([(header, response[header]) for header in \
+            ('ETag', 'Last-Modified') if response.has_header(header)])
+        not_modified = self.get_not_modified(request, validators)
+        if not_modified:
+            return not_modified
+
+        response = compress_response(request, response)
+        if request.method == 'HEAD':
+            if not getattr(response, 'streaming', False):
+                response['Content-Length'] = str(len(response.content))
+            response.content = ''
+
+        return response
+
+    def is_cacheable(self, request, method):
+        """Wheter the response for the given method can be retrieved from
+        or stored in the cache"""
+        if request.method not in ('GET', 'HEAD') or not method.cache:
+            return False
+
+        return self.may_bypass(request, method)
+
+    def may_bypass(self, request, method):
+        """Wheter the response may be produced without calling the function.
+        Never let anonymous users skip the login check"""
+        return not method.requires_login or request.user.is_authenticated()
@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2008 Alberto García Hierro <fiam@rm-fr.net>
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+"""Response caching for Wapi functions. Cache entries are tagged, and
+invalidating a tag makes every entry tagged with it unreachable."""
+
+import time
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+
+from wapi.utils import params_repr
+
+CACHE_PREFIX = getattr(settings, 'WAPI_CACHE_PREFIX', 'wapi')
+# Tag versions should outlive any cached response
+TAG_TIMEOUT = 60 * 60 * 24 * 30
+
+def get_tag_key(tag):
+    """Returns the cache key which stores the version of the given tag"""
+    return '%s:tag:%s' % (CACHE_PREFIX, hashlib.md5(tag).hexdigest())
+
+def resolve_tags(tags, request, dct):
+    """Returns the tag names, calling the callables in tags with the
+    request and the validated parameters"""
+    resolved = []
+    for tag in tags:
+        if callable(tag):
+            resolved.extend(tag(request, dct))
+        else:
+            resolved.append(tag)
+
+    return [unicode(tag).encode('utf8') for tag in resolved]
+
+def get_tag_versions(tags):
+    """Returns the current versions of the given tags, creating them
+    if needed"""
+    keys = [get_tag_key(tag) for tag in tags]
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            versions[key] = repr(time.time())
+            cache.set(key, versions[key], TAG_TIMEOUT)
+
+    return [versions[key] for key in keys]
+
+def invalidate_tags(tags):
+    """Invalidates every cached response tagged with any of the given tags"""
+    version = repr(time.time())
+    for tag in tags:
+        cache.set(get_tag_key(tag), version, TAG_TIMEOUT)
+
+def get_cache_key(function, request, dct, format):
+    """Returns the key for caching the response of the given function
+    when called with the given validated parameters"""
+    options = function.cache
+    parts = [function.name, format, params_repr(dct)]
+    if options.vary_on_user:
+        if request.user.is_authenticated():
+            parts.append(unicode(request.user.pk))
+        else:
+            parts.append('')
+
+    tags = resolve_tags(options.tags, request, dct)
+    parts.extend(get_tag_versions(tags))
+    digest = hashlib.md5(u'\0'.join(parts).encode('utf8')).hexdigest()
+    return '%s:response:%s' % (CACHE_PREFIX, digest)
+
+def get_cached_response(key):
+    """Returns the response stored with the given key or None"""
+    cached = cache.get(key)
+    if cached is None:
+        return None
+
+    status_code, headers, content = cached
+    response = HttpResponse(content)
+    response.status_code = status_code
+    for header, value in headers:
+        response[header] = value
+
+    return response
+
+def cache_response(key, response, ttl=None):
+    """Stores the response. Note that streamed responses are consumed
+    when they are cached"""
+    if response.status_code != 200:
+        return
+
+    content = response.content
+    # Reset the content, since it could be an exhausted iterator
+    response.content = content
+    response.streaming = False
+    cache.set(key, (response.status_code, response.items(), content), ttl)
@@ -36,6 +36,10 @@ def wraps(wrapped, wrapper):
         '_read_only_',
         '_write_only_',
         '_private_',
+        '_cache_',
+        '_invalidates_',
+        '_last_modified_',
+        '_version_key_',
     )
 
     for attr in conditionally_assigned:
@@ -74,6 +78,51 @@ def undocumented(func):
     func._undocumented_ = True
     return func
 
+class cached(object):
+    """Caches the responses of a read function. The cache key includes
+    the validated parameters, the format, the current version of every
+    tag and, if vary_on_user is True, the user. tags can contain strings
+    or callables, which receive the request and the validated
+    parameters and return a list of tags"""
+    def __init__(self, ttl=None, vary_on_user=False, tags=None):
+        self.ttl = ttl
+        self.vary_on_user = vary_on_user
+        self.tags = tags or ()
+
+    def __call__(self, func):
+        func._cache_ = self
+        return func
+
+def invalidates(*tags):
+    """Invalidates the cached responses with any of the given tags after
+    the function is successfully called trough POST. Callables are
+    accepted, like in cached"""
+    def decorator(func):
+        func._invalidates_ = tags
+        return func
+
+    return decorator
+
+def last_modified(last_modified_func):
+    """Declares a callable which receives the request and the validated
+    parameters and returns when the response was last modified, as a
+    datetime or a timestamp. It's called before the function, which
+    won't run at all if the client has a fresh response"""
+    def decorator(func):
+        func._last_modified_ = last_modified_func
+        return func
+
+    return decorator
+
+def version_key(version_func):
+    """Like last_modified, but the callable returns a version identifier
+    of the response, which is used for generating its ETag"""
+    def decorator(func):
+        func._version_key_ = version_func
+        return func
+
+    return decorator
+
 class function_parameter(object):
     """Base class for decorators which specify function parameters"""
     func_attr = None
@@ -46,8 +46,8 @@ class ApiDocumentator(object):
                 functions.append(function)
 
         functions.sort(cmp=lambda x, y: cmp(x.name, y.name))
+        namespaces = []
         if hasattr(self.api.__class__, 'NAMESPACES'):
-            namespaces = []
             for name, nsname in self.api.NAMESPACES:
                 namespaces.append(ApiNamespace(name, nsname, functions))
 
@@ -43,7 +43,15 @@ try:
 except ImportError:
     pass
 
+try:
+    from wapi.formatters.msgpack_formatter import MsgPackFormatter
+except ImportError:
+    pass
+
+from wapi.formatters.csv_formatter import CsvFormatter, TsvFormatter
+
 from wapi.formatters.base import _FORMATTERS_REGISTER
+from wapi.formatters.values import register_value_encoder, encode_value
 
 class UnknownFormat(Exception):
     """Raised when the formatter for an unknown format is requested"""
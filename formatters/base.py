@@ -24,6 +24,8 @@
 
 _FORMATTERS_REGISTER = {}
 
+DEFAULT_CHUNK_SIZE = 16384
+
 class FormatterType(type):
     """Metaclass for formatters. Autoregisters them"""
     def __init__(mcs, name, bases, dct):
@@ -34,9 +36,12 @@ class FormatterType(type):
 
 class BaseFormatter(object):
     """Abstract base class for all the formatters"""
+    chunk_size = DEFAULT_CHUNK_SIZE
+
     def __init__(self, *args, **kwargs):
         self.data = ''
         self.out = kwargs.get('out')
+        self.chunk_size = kwargs.get('chunk_size') or self.__class__.chunk_size
 
     def start(self):
         """Called before a new formatting starts"""
@@ -66,6 +71,34 @@ class BaseFormatter(object):
         """Formats a single element"""
         raise NotImplementedError
 
+    def stream_list(self, data):
+        """Formats a list of elements, yielding the result in chunks.
+        Formatters which can encode the elements one by one should
+        override this, the default implementation formats the whole
+        list at once"""
+        data = list(data)
+        if data:
+            self.format_list(data)
+        else:
+            self.empty()
+        self.end()
+        yield self.data
+
+    def buffered(self, pieces):
+        """Groups the given pieces into chunks of at least chunk_size bytes"""
+        buf = []
+        size = 0
+        for piece in pieces:
+            buf.append(piece)
+            size += len(piece)
+            if size >= self.chunk_size:
+                yield ''.join(buf)
+                buf = []
+                size = 0
+
+        if buf:
+            yield ''.join(buf)
+
 class Formatter(BaseFormatter):
     __metaclass__ = FormatterType
 
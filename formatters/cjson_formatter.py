@@ -20,21 +20,10 @@
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
 # THE SOFTWARE.
 
-"""this is a JSON encoder based on a patched cjson supporting
-datetime.datetime and Decimal objects. To use it instead of the
-default one (simplejson based) do the following:
+"""Kept for compatibility. JsonFormatter now uses the fastest JSON
+encoder available, see wapi.formatters.json_formatter"""
 
-from wapi.formatters.cjson_formatter import CJsonFormatter
-from wapi.formatters import register_formatter
-register_formatter(CJsonFormatter)"""
-
-from wapi import cjson
 from wapi.formatters.json_formatter import JsonFormatter
 
 class CJsonFormatter(JsonFormatter):
-    def format(self, data):
-        self.data = cjson.encode(data[1])
-
-    def format_list(self, data):
-        self.data = cjson.encode([obj[1] for obj in data])
-
+    pass
@@ -0,0 +1,140 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2008 Alberto García Hierro <fiam@rm-fr.net>
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+"""CSV and TSV formatters for flat lists of objects. Nested dicts are
+flattened into dotted column names"""
+
+import csv
+from decimal import Decimal
+
+try:
+    from cStringIO import StringIO
+except ImportError:
+    from StringIO import StringIO
+
+from django.utils.encoding import smart_unicode
+from wapi.exceptions import ApiBadRequest
+from wapi.formatters.base import Formatter
+from wapi.formatters.values import encode_value
+from wapi.utils import prime
+
+class TabularDataError(ApiBadRequest):
+    """Raised when the serialized data can't be represented as a table"""
+    pass
+
+class CsvFormatter(Formatter):
+    """Writes a header followed by a row per object. The columns are taken
+    from the columns argument or, when not given, from the first object"""
+    format_name = 'csv'
+    dialect = csv.excel
+    # Written as they are, without consulting the value encoders
+    native_types = (basestring, Decimal)
+
+    def __init__(self, *args, **kwargs):
+        super(CsvFormatter, self).__init__(*args, **kwargs)
+        self.columns = kwargs.get('columns')
+        self.buf = StringIO()
+        self.writer = csv.writer(self.buf, dialect=self.dialect)
+
+    def flatten(self, key, value, row):
+        """Stores value in row, adding a column for each value in nested
+        dicts. Lists can't be represented in a single cell"""
+        if not isinstance(value, self.native_types):
+            value = encode_value(value)
+
+        if isinstance(value, dict):
+            for child_key, child_value in value.items():
+                self.flatten('%s.%s' % (key, child_key), child_value, row)
+        elif isinstance(value, list) or isinstance(value, tuple):
+            raise TabularDataError('Column "%s" contains a list, which '
+                'can\'t be represented in %s' % (key, self.format_name))
+        else:
+            row[key] = value
+
+    def get_row(self, obj):
+        """Returns a dict which maps the columns to the values of obj"""
+        row = {}
+        if isinstance(obj[1], dict):
+            for key, value in obj[1].items():
+                self.flatten(key, value, row)
+        else:
+            self.flatten(obj[0], obj[1], row)
+        return row
+
+    def encode(self, value):
+        if value is None:
+            return ''
+        if isinstance(value, float):
+            # str() only keeps 12 significant digits
+            return repr(value)
+        return smart_unicode(value).encode('utf8')
+
+    def write(self, values):
+        """Returns the line for the given values"""
+        self.writer.writerow([self.encode(value) for value in values])
+        line = self.buf.getvalue()
+        self.buf.seek(0)
+        self.buf.truncate()
+        return line
+
+    def iter_rows(self, data):
+        """Yields the row for every object, checking the first one before
+        the header is written"""
+        columns = self.columns
+        for obj in data:
+            row = self.get_row(obj)
+            if not columns:
+                columns = sorted(row.keys())
+                yield self.write(columns)
+            elif not self.columns:
+                extra = set(row.keys()).difference(columns)
+                if extra:
+                    raise TabularDataError('Columns %s are not in the ' \
+                        'first object, declare the columns to include ' \
+                        'them' % ', '.join(sorted(extra)))
+            yield self.write([row.get(column) for column in columns])
+
+    def iter_list(self, data):
+        """Yields the header and then the line for every object"""
+        rows = prime(self.iter_rows(data))
+        if self.columns:
+            yield self.write(self.columns)
+        for line in rows:
+            yield line
+
+    def format_list(self, data):
+        self.data = ''.join(self.iter_list(data))
+
+    def format(self, obj):
+        self.data = ''.join(self.iter_list([obj]))
+
+    def empty(self):
+        self.data = ''.join(self.iter_list([]))
+
+    def stream_list(self, data):
+        """Streams the lines. The first object is checked before returning,
+        so TabularDataError is raised before the response starts"""
+        return self.buffered(prime(self.iter_list(data)))
+
+class TsvFormatter(CsvFormatter):
+    format_name = 'tsv'
+    dialect = csv.excel_tab
@@ -20,41 +20,113 @@
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
 # THE SOFTWARE.
 
-"""simplejson based JSON encoder"""
-
-from decimal import Decimal
-from datetime import datetime
+"""JSON formatter. Uses the fastest JSON encoder available, unless the
+WAPI_JSON_BACKEND setting picks one of JSON_BACKENDS"""
 
 try:
     from django.utils import simplejson
 except ImportError:
     import simplejson
 
-from django.utils.encoding import smart_unicode
+from django.conf import settings
 from wapi.formatters.base import Formatter
+from wapi.formatters.values import encode_unknown as default
 
 class JsonEncoder(simplejson.JSONEncoder):
-    """Extends the default encoder, using the class __unicode__ to
-    represent unknown objects"""
+    """Extends the default encoder, using the registered value encoders
+    or the class __unicode__ to represent unknown objects"""
     def default(self, obj):
         try:
             return simplejson.JSONEncoder.default(self, obj)
         except TypeError:
-            if isinstance(obj, Decimal):
-                return float(obj)
-            if isinstance(obj, datetime):
-                return obj.strftime('%a, %d %b %Y %H:%M:%S %z')
-            return smart_unicode(obj)
+            return default(obj)
+
+def _load_simplejson():
+    import simplejson as module
+    return module
+
+def _load_json():
+    import json as module
+    return module
+
+def _load_django():
+    return simplejson
+
+# In order of preference. All of them produce the same output
+JSON_BACKENDS = (
+    ('simplejson', _load_simplejson),
+    ('json', _load_json),
+    ('django', _load_django),
+)
+
+def has_speedups(module):
+    """Wheter the module encodes using its C extension"""
+    encoder = getattr(module, 'encoder', None)
+    return getattr(encoder, 'c_make_encoder', None) is not None
+
+def get_json_backend(name=None):
+    """Returns the name and the module of the given backend or, if no
+    name is given, of the first one in JSON_BACKENDS which has its C
+    speedups available"""
+    backends = dict(JSON_BACKENDS)
+    if name:
+        try:
+            load = backends[name]
+        except KeyError:
+            raise RuntimeError('Unknown JSON backend "%s"' % name)
+        try:
+            return name, load()
+        except ImportError:
+            raise RuntimeError('JSON backend "%s" is not installed' % name)
+
+    for name, load in JSON_BACKENDS:
+        try:
+            module = load()
+        except ImportError:
+            continue
+        if has_speedups(module):
+            return name, module
+
+    return 'django', simplejson
+
+def get_encode(module):
+    """Returns a function which encodes to JSON using the given module"""
+    try:
+        # Represent Decimals as floats with simplejson >= 2.1
+        encoder = module.JSONEncoder(default=default, use_decimal=False)
+    except TypeError:
+        encoder = module.JSONEncoder(default=default)
+    return encoder.encode
+
+JSON_BACKEND, _JSON_MODULE = get_json_backend(
+    getattr(settings, 'WAPI_JSON_BACKEND', None))
+encode = get_encode(_JSON_MODULE)
 
 class JsonFormatter(Formatter):
     format_name = 'json'
 
     def format(self, data):
-        self.data = simplejson.dumps(data[1], cls=JsonEncoder)
+        self.data = encode(data[1])
 
     def format_list(self, data):
-        self.data = simplejson.dumps([obj[1] for obj in data], cls=JsonEncoder)
+        self.data = encode([obj[1] for obj in data])
 
     def empty(self):
         self.data = '[]'
 
+    def stream_list(self, data):
+        return self.buffered(self.iter_list(data))
+
+    def iter_list(self, data):
+        """Encodes the elements one by one, yielding the pieces of the
+        resulting JSON array"""
+        separator = '['
+        for obj in data:
+            yield separator
+            yield encode(obj[1])
+            separator = ', '
+
+        if separator == '[':
+            yield '[]'
+        else:
+            yield ']'
@@ -0,0 +1,46 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2008 Alberto García Hierro <fiam@rm-fr.net>
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+"""MessagePack formatter. Values unknown to MessagePack are encoded like
+the JSON formatter does"""
+
+import msgpack
+
+from wapi.formatters.base import Formatter
+from wapi.formatters.values import encode_unknown as default
+
+class MsgPackFormatter(Formatter):
+    """MessagePack arrays start with their length, so lists are always
+    packed at once, even when streaming"""
+    format_name = 'msgpack'
+
+    def packer(self):
+        return msgpack.Packer(default=default)
+
+    def format(self, data):
+        self.data = self.packer().pack(data[1])
+
+    def format_list(self, data):
+        self.data = self.packer().pack([obj[1] for obj in data])
+
+    def empty(self):
+        self.data = self.packer().pack_array_header(0)
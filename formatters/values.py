@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2008 Alberto García Hierro <fiam@rm-fr.net>
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+"""Registry of encoders for the values which the formats can't represent
+by themselves. Every formatter consults it, so a type only needs to be
+registered once"""
+
+from decimal import Decimal
+from datetime import datetime
+from inspect import getmro
+
+from django.utils.encoding import smart_unicode
+
+_VALUE_ENCODERS = {}
+_VALUE_ENCODERS_CACHE = {}
+
+# Lookup tables for format_rfc2822
+_DAYS = ('Mon, ', 'Tue, ', 'Wed, ', 'Thu, ', 'Fri, ', 'Sat, ', 'Sun, ')
+_MONTH_DAYS = ['%02d ' % day for day in range(32)]
+_MONTHS = (None, 'Jan ', 'Feb ', 'Mar ', 'Apr ', 'May ', 'Jun ', 'Jul ',
+    'Aug ', 'Sep ', 'Oct ', 'Nov ', 'Dec ')
+_MINUTES = [' %02d:%02d:' % divmod(minute, 60) for minute in range(1440)]
+_SECONDS = ['%02d ' % second for second in range(60)]
+
+def format_rfc2822(value):
+    """Formats a datetime like strftime('%a, %d %b %Y %H:%M:%S %z') does
+    in the C locale, using lookup tables instead of strftime"""
+    offset = None
+    if value.tzinfo is not None:
+        offset = value.utcoffset()
+
+    if offset is None:
+        zone = ''
+    else:
+        seconds = offset.days * 86400 + offset.seconds
+        if seconds < 0:
+            zone = '-'
+            seconds = -seconds
+        else:
+            zone = '+'
+        zone += '%02d%02d' % (seconds // 3600, seconds % 3600 // 60)
+
+    return ''.join((_DAYS[value.weekday()], _MONTH_DAYS[value.day],
+        _MONTHS[value.month], str(value.year),
+        _MINUTES[value.hour * 60 + value.minute], _SECONDS[value.second],
+        zone))
+
+def register_value_encoder(cls, encoder):
+    """Makes the formatters represent the instances of cls and its
+    subclasses as encoder(value). The encoder must return strings,
+    numbers, booleans, None, lists or dicts"""
+    _VALUE_ENCODERS[cls] = encoder
+    _VALUE_ENCODERS_CACHE.clear()
+
+def get_value_encoder(cls):
+    """Returns the encoder registered for the nearest class in the MRO of
+    cls, or None if there's none"""
+    try:
+        return _VALUE_ENCODERS_CACHE[cls]
+    except KeyError:
+        pass
+
+    encoder = None
+    for klass in getmro(cls):
+        if klass in _VALUE_ENCODERS:
+            encoder = _VALUE_ENCODERS[klass]
+            break
+
+    _VALUE_ENCODERS_CACHE[cls] = encoder
+    return encoder
+
+def encode_value(value):
+    """Returns the encoded value, or value itself if no encoder has
+    been registered for its class"""
+    encoder = get_value_encoder(value.__class__)
+    if encoder is None:
+        return value
+    return encoder(value)
+
+def encode_unknown(value):
+    """Like encode_value, but represents the values without encoder as
+    unicode. Meant for the values unknown to a format"""
+    encoder = get_value_encoder(value.__class__)
+    if encoder is None:
+        return smart_unicode(value)
+    return encoder(value)
+
+register_value_encoder(Decimal, float)
+register_value_encoder(datetime, format_rfc2822)
@@ -20,47 +20,95 @@
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
 # THE SOFTWARE.
 
-"""cElementTree base XML formatter"""
+"""Incremental XML formatter. Elements are written as they are walked
+instead of building an ElementTree in memory, but the output is the same
+cElementTree would produce."""
 
-from datetime import datetime
+from decimal import Decimal
+from itertools import chain
+from xml.sax.saxutils import escape
 
-from django.utils.encoding import smart_unicode
+from django.utils.encoding import smart_unicode, smart_str
 from wapi.formatters.base import Formatter
+from wapi.formatters.values import encode_value
 
-from xml.etree import cElementTree as ET
+XML_DECLARATION = "<?xml version='1.0' encoding='utf8'?>\n"
 
 class XmlFormatter(Formatter):
     format_name = 'xml'
+    root_name = 'objects'
+    # Written as they are, without consulting the value encoders
+    native_types = (basestring, Decimal)
 
     def __init__(self, *args, **kwargs):
         super(XmlFormatter, self).__init__(*args, **kwargs)
-        self.root = None
+        self.pieces = []
 
-    def start(self, name='objects'):
-        self.root = ET.Element(name)
+    def start(self):
+        self.pieces = []
 
     def end(self):
-        self.data = ET.tostring(self.root, 'utf8')
-
-    def format_element(self, parent, data):
-        """Formats one element and appends it to 'parent'"""
-        for key, value in data.items():
-            element = ET.SubElement(parent, key)
-            if isinstance(value, dict):
-                self.format_element(element, value)
-            elif isinstance(value, list) or isinstance(value, tuple):
-                for item in value:
-                    self.format_element(element, { 'item': item })
-            elif isinstance(value, datetime):
-                element.text = value.strftime('%a, %d %b %Y %H:%M:%S %z')
-            else:
-                element.text = smart_unicode(value)
+        self.data = XML_DECLARATION + ''.join(self.pieces)
+
+    def empty(self):
+        self.pieces.append('<%s />' % self.root_name)
+
+    def iter_element(self, key, value):
+        """Yields the pieces of the XML representation of one element"""
+        tag = smart_str(key)
+        if not isinstance(value, self.native_types):
+            value = encode_value(value)
+
+        if isinstance(value, dict):
+            if not value:
+                yield '<%s />' % tag
+                return
+            yield '<%s>' % tag
+            for child_key, child_value in value.items():
+                for piece in self.iter_element(child_key, child_value):
+                    yield piece
+            yield '</%s>' % tag
+            return
+
+        if isinstance(value, list) or isinstance(value, tuple):
+            if not value:
+                yield '<%s />' % tag
+                return
+            yield '<%s>' % tag
+            for item in value:
+                for piece in self.iter_element('item', item):
+                    yield piece
+            yield '</%s>' % tag
+            return
+
+        text = smart_unicode(value)
+        if text:
+            yield '<%s>%s</%s>' % (tag, escape(text).encode('utf8'), tag)
+        else:
+            yield '<%s />' % tag
+
+    def iter_list(self, data):
+        """Yields the pieces of the root element containing every object
+        in data"""
+        tag = smart_str(self.root_name)
+        empty = True
+        for obj in data:
+            if empty:
+                yield '<%s>' % tag
+                empty = False
+            for piece in self.iter_element(obj[0], obj[1]):
+                yield piece
+
+        if empty:
+            yield '<%s />' % tag
+        else:
+            yield '</%s>' % tag
 
     def format_list(self, data):
-        for obj in data:
-            self.format_element(self.root, {obj[0]: obj[1]})
+        self.pieces.extend(self.iter_list(data))
 
     def format(self, obj):
-        self.start(obj[0])
-        self.format_element(self.root, obj[1])
+        self.pieces.extend(self.iter_element(obj[0], obj[1]))
 
+    def stream_list(self, data):
+        return self.buffered(chain([XML_DECLARATION], self.iter_list(data)))
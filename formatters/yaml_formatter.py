@@ -20,38 +20,87 @@
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
 # THE SOFTWARE.
 
-"""PyYAML based YAML formatter"""
+"""PyYAML based YAML formatter. Uses the libyaml emitter when PyYAML has
+been built with it, falling back to the pure Python one otherwise"""
 
 from decimal import Decimal
 from datetime import datetime
 
 import yaml
 from wapi.formatters.base import Formatter
+from wapi.formatters.values import encode_value
 
-class Dumper(yaml.dumper.SafeDumper):
-    """Dumper with support for representing Decimal objects,
-    generators and datetime objects as per RFC2822"""
-    def __init__(self, *args, **kwargs):
-        super(Dumper, self).__init__(*args, **kwargs)
+try:
+    from yaml import CSafeDumper as BaseDumper
+    HAS_LIBYAML = True
+except ImportError:
+    from yaml import SafeDumper as BaseDumper
+    HAS_LIBYAML = False
 
+FLOAT_TAG = u'tag:yaml.org,2002:float'
+
+class RepresenterMixin(object):
+    """Adds support for representing Decimal objects, generators and
+    the values with a registered encoder"""
     def represent_decimal(self, value):
-        """Represent Decimal as float"""
-        return self.represent_scalar(u'tag:yaml.org,2002:float', str(value))
+        """Represent Decimal as float. Values which wouldn't be read as
+        floats, like 1, are quoted like the pure Python emitter does,
+        since libyaml would write them as plain scalars"""
+        value = str(value)
+        style = None
+        if self.resolve(yaml.ScalarNode, value, (True, False)) != FLOAT_TAG:
+            style = "'"
+        return self.represent_scalar(FLOAT_TAG, value, style=style)
+
+    def represent_encoded(self, value):
+        """Represent the value returned by its registered encoder"""
+        encoded = encode_value(value)
+        if encoded is value:
+            return self.represent_undefined(value)
+        return self.represent_data(encoded)
+
+    @classmethod
+    def add_wapi_representers(cls):
+        """Registers the representers in the given dumper class"""
+        cls.add_representer(Decimal, cls.represent_decimal)
+        # datetime has its own representer, which would be used otherwise
+        cls.add_representer(datetime, cls.represent_encoded)
+        cls.add_representer((x for x in []).__class__, cls.represent_list)
+        cls.add_multi_representer(object, cls.represent_encoded)
 
-    def represent_datetime(self, value):
-        """Represent datetime.datetime as per RFC2822"""
-        return self.represent_unicode(value.strftime('%a, %d %b %Y %H:%M:%S %z'))
+class PyDumper(RepresenterMixin, yaml.dumper.SafeDumper):
+    """Pure Python dumper"""
+    pass
 
-Dumper.add_representer(Decimal, Dumper.represent_decimal)
-Dumper.add_representer(datetime, Dumper.represent_datetime)
-Dumper.add_representer((x for x in []).__class__, Dumper.represent_list)
+class Dumper(RepresenterMixin, BaseDumper):
+    """Fastest available dumper"""
+    pass
+
+PyDumper.add_wapi_representers()
+Dumper.add_wapi_representers()
 
 class YamlFormatter(Formatter):
     format_name = 'yaml'
+    dumper = Dumper
 
     def format(self, data):
-        self.data = yaml.dump({data[0]: data[1]}, Dumper=Dumper)
+        self.data = yaml.dump({data[0]: data[1]}, Dumper=self.dumper)
 
     def format_list(self, data):
-        self.data = yaml.dump(({obj[0]: obj[1]} for obj in data), Dumper=Dumper)
+        self.data = yaml.dump(({obj[0]: obj[1]} for obj in data),
+            Dumper=self.dumper)
+
+    def iter_list(self, data):
+        """Dumps the elements one by one as items of a block sequence, which
+        yields the same output as format_list. Note that anchors can't be
+        shared between different elements"""
+        for obj in data:
+            yield yaml.dump([{obj[0]: obj[1]}], Dumper=self.dumper)
+
+    def stream_list(self, data):
+        return self.buffered(self.iter_list(data))
 
+class PyYamlFormatter(YamlFormatter):
+    """YAML formatter which always uses the pure Python dumper. It's not
+    registered by default"""
+    dumper = PyDumper
@@ -25,6 +25,7 @@
 import re
 
 from wapi.exceptions import ApiMissingParam
+from wapi.utils import is_fieldset_param
 
 NAMESPACE_RE = re.compile('(.*)__.*?')
 
@@ -36,24 +37,70 @@ class ApiFunction(object):
         self.required_parameters = getattr(func, '_required_parameters_', [])
         self.optional_parameters = getattr(func, '_optional_parameters_', [])
         self.doc = func.__doc__
+        self._validate = self.compile()
 
     def __call__(self, request, dct):
-        for parameter in self.required_parameters:
-            parameter.get(request, dct)
-        for parameter in self.optional_parameters:
-            try:
-                parameter.get(request, dct)
-            except ApiMissingParam:
-                parameter.set_default(request, dct)
-
+        self.validate(request, dct)
         return self.func(request, dct)
 
+    def validate(self, request, dct):
+        """Validates the parameters in dct, storing the converted values
+        and the defaults for the missing optional parameters"""
+        self._validate(request, dct)
+
+    def compile(self):
+        """Returns the function used by validate, which checks every
+        parameter without raising exceptions for the missing ones"""
+        required = [(p.name, p.compile()) for p in self.required_parameters]
+        optional = [(p.compile(), p.set_default) \
+            for p in self.optional_parameters]
+
+        def validate(request, dct):
+            for name, check in required:
+                if not check(request, dct):
+                    raise ApiMissingParam(param=name)
+            for check, set_default in optional:
+                if not check(request, dct):
+                    set_default(request, dct)
+
+        return validate
+
+    @property
+    def accepts_fieldsets(self):
+        """Wheter the output can be pruned with the 'fields' parameters.
+        Functions which declare a parameter with one of their names use
+        it for their own purposes"""
+        for param in self.required_parameters + self.optional_parameters:
+            if is_fieldset_param(param.name):
+                return False
+        return True
 
     @property
     def requires_login(self):
         """Wheter the function requires a logged-in user"""
         return hasattr(self.func, 'requires_login') and self.func.requires_login
 
+    @property
+    def cache(self):
+        """The caching options for the function, if its responses
+        are cached"""
+        return getattr(self.func, '_cache_', None)
+
+    @property
+    def invalidates(self):
+        """The cache tags invalidated by the function"""
+        return getattr(self.func, '_invalidates_', ())
+
+    @property
+    def last_modified(self):
+        """Callable returning the last modification time of the response"""
+        return getattr(self.func, '_last_modified_', None)
+
+    @property
+    def version_key(self):
+        """Callable returning the version of the response"""
+        return getattr(self.func, '_version_key_', None)
+
     @property
     def endpoint(self):
         """Returns the function endpoint used by the RestBinding"""
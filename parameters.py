@@ -20,10 +20,12 @@
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
 # THE SOFTWARE.
 
+from UserDict import DictMixin
+
 from django.utils.translation import ugettext_lazy as _
 from django.forms import ValidationError
 
-from wapi.validators import get_type_validator
+from wapi.validators import get_type_validator, get_list_validator, ID
 from wapi.exceptions import ApiMissingParam, ApiInvalidParam
 
 FRIENDLY_TYPE_NAMES = {
@@ -34,6 +36,7 @@ FRIENDLY_TYPE_NAMES = {
     unicode: _('UTF-8 String'),
     bool: _('Boolean'),
     file: _('File'),
+    ID: _('Object id'),
 }
 
 class FunctionParameter(object):
@@ -70,6 +73,36 @@ class FunctionParameter(object):
         dct[self.name] = value
         return value
 
+    def compile(self):
+        """Returns a function which validates the parameter like get does,
+        but returns wheter it was present instead of raising
+        ApiMissingParam"""
+        if self.__class__.get.im_func is not FunctionParameter.get.im_func:
+            # Subclasses overriding get are checked trough it
+            def check(request, dct):
+                try:
+                    self.get(request, dct)
+                except ApiMissingParam:
+                    return False
+                return True
+            return check
+
+        name = self.name
+        validators = tuple(self.validators)
+        def check(request, dct):
+            if name not in dct:
+                return False
+            value = dct[name]
+            for validator in validators:
+                try:
+                    value = validator(value)
+                except ValidationError:
+                    raise ApiInvalidParam(param=name, value=value)
+            dct[name] = value
+            return True
+
+        return check
+
     def set_default(self, request, dct):
         """Store the default value in the given dictionary"""
         dct[self.name] = self.default
@@ -123,6 +156,84 @@ class FileFunctionParameter(FunctionParameter):
         dct[self.name] = fobj
         return fobj
 
+    def compile(self):
+        if self.__class__.get.im_func is not FileFunctionParameter.get.im_func:
+            return super(FileFunctionParameter, self).compile()
+
+        name = self.name
+        validators = tuple(self.validators)
+        def check(request, dct):
+            if name not in request.FILES:
+                return False
+            fobj = request.FILES[name]
+            for validator in validators:
+                validator(fobj)
+            dct[name] = fobj
+            return True
+
+        return check
+
+class ListFunctionParameter(FunctionParameter):
+    """A parameter containing a list of item_type values, given as a comma
+    separated list or repeating the parameter. The list is stored as an
+    array for numbers and as a tuple for strings"""
+    def __init__(self, name, item_type, doc=None, validators=None,
+            default=None, max_count=None):
+        validator = get_list_validator(item_type)
+        if validator is None:
+            raise RuntimeError('No list validator for type %s' % item_type)
+        validators = validators or []
+        if not hasattr(validators, '__iter__'):
+            validators = [validators]
+        super(ListFunctionParameter, self).__init__(name, list, doc,
+            [validator(max_count=max_count)] + list(validators), default)
+        self.item_type = item_type
+        self.max_count = max_count
+
+    def get_values(self, dct):
+        """Returns every value given for the parameter"""
+        try:
+            return dct.getlist(self.name)
+        except AttributeError:
+            return dct[self.name]
+
+    def get(self, request, dct):
+        if self.name not in dct:
+            raise ApiMissingParam(param=self.name)
+
+        value = self.get_values(dct)
+        for validator in self.validators:
+            try:
+                value = validator(value)
+            except ValidationError, e:
+                # The value might be too long for including it
+                raise ApiInvalidParam('Invalid value for parameter "%s": %s' \
+                    % (self.name, u' '.join(e.messages)))
+
+        dct[self.name] = value
+        return value
+
+    def compile(self):
+        if self.__class__.get.im_func is not ListFunctionParameter.get.im_func:
+            return super(ListFunctionParameter, self).compile()
+
+        def check(request, dct):
+            if self.name not in dct:
+                return False
+            self.get(request, dct)
+            return True
+
+        return check
+
+    @property
+    def type_name(self):
+        """Returns the friendly name for the type of the items"""
+        try:
+            item_name = FRIENDLY_TYPE_NAMES[self.item_type]
+        except KeyError:
+            item_name = self.item_type.__name__
+        return _('%s list') % item_name
+
 class FunctionParameterSet(object):
     """Container for multiple FunctionParameters"""
     def __init__(self, *args):
@@ -139,4 +250,78 @@ class FunctionParameterSet(object):
     def __iter__(self):
         return self.parameters.__iter__()
 
+class ParameterView(DictMixin):
+    """Dict-like view of the request parameters. The values stored in it,
+    like the validated ones, overlay the request data without modifying
+    it, so the request parameters don't need to be copied"""
+    def __init__(self, data):
+        self.data = data
+        self.overlay = {}
+        self.deleted = set()
+
+    def __getitem__(self, key):
+        try:
+            values = self.overlay[key]
+        except KeyError:
+            if key in self.deleted:
+                raise
+            return self.data[key]
+
+        if values:
+            return values[-1]
+        return []
+
+    def __setitem__(self, key, value):
+        self.overlay[key] = [value]
+        self.deleted.discard(key)
+
+    def __delitem__(self, key):
+        if key not in self:
+            raise KeyError(key)
+        self.overlay.pop(key, None)
+        self.deleted.add(key)
+
+    def __contains__(self, key):
+        if key in self.overlay:
+            return True
+        return key not in self.deleted and key in self.data
+
+    has_key = __contains__
+
+    def keys(self):
+        keys = [key for key in self.data.keys() \
+            if key not in self.overlay and key not in self.deleted]
+        return keys + self.overlay.keys()
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def __len__(self):
+        return len(self.keys())
+
+    def getlist(self, key):
+        """Returns every value for key, like QueryDict.getlist"""
+        if key in self.overlay:
+            return self.overlay[key]
+        if key in self.deleted:
+            return []
+        try:
+            return self.data.getlist(key)
+        except AttributeError:
+            return [self.data[key]]
+
+    def setlist(self, key, values):
+        self.overlay[key] = list(values)
+        self.deleted.discard(key)
+
+    def lists(self):
+        return [(key, self.getlist(key)) for key in self.keys()]
+
+    def copy(self):
+        view = ParameterView(self.data)
+        view.overlay = dict([(k, list(v)) for k, v in self.overlay.items()])
+        view.deleted = set(self.deleted)
+        return view
 
+    def __repr__(self):
+        return '<ParameterView: %r>' % dict(self.lists())
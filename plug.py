@@ -20,39 +20,117 @@
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
 # THE SOFTWARE.
 
-### THIS IS CURRENTLY NOT WORKING ###
+"""ApiPlug: mounts several versions of an API, with their bindings and
+their documentation, behind a single view"""
 
-import re
+from inspect import isclass
 
 from django.http import Http404
 
 from wapi.documentator import ApiDocumentator
-from wapi.utils import get_instance
+
+# Key used in the route trie for storing the view of a path
+_VIEW = None
+
+def split_path(path):
+    """Returns the non-empty segments of the given path"""
+    return [segment for segment in path.split('/') if segment]
 
 class ApiPlug(object):
+    """View which routes the requests to the bindings of one or more API
+    versions. Subclasses define the version, the api, the auth_methods
+    shown in the documentation and the bindings, a list of (name, binding)
+    tuples. Binding classes are instantiated with the api. Other versions
+    are mounted by passing their ApiPlug subclasses to the constructor, e.g.:
+
+        (r'^api/', MyApiPlug('api', MyApiPlugV2)),
+
+    Functions are exposed at /<base>/<version>/<binding name>/<function>.<format>
+    and the documentation at /<base>/<version>/doc/. All the routes are
+    compiled into a trie keyed by path segments, so resolving a request
+    doesn't depend on the number of exposed functions."""
     version = '1.0'
     bindings = []
     auth_methods = []
     api = None
 
-    def __init__(self, base, *args, **kwargs):
-        super(ApiPlug, self).__init__(args, kwargs)
-        cls = self.__class__
-        self.documentator = ApiDocumentator(auth_methods=cls.auth_methods, api=cls.api)
-        self.bnds = []
-        self.re = {
-            re.compile(r'/%s%s/doc/$' % (base, cls.version)): self.documentator.__call__,
-        }
-        if not cls.auth_methods:
-            for binding in cls.bindings:
-                bnds.append(binding())
-                self.re.update({
-                    re.compile(r'/%s%s/%s/$' % (base, cls.version, binding)): self.documentator.__call__,
-                })
+    def __init__(self, base, *versions):
+        self.base = split_path(base)
+        self.routes = {}
+        for plug in (self.__class__, ) + versions:
+            self.mount(plug)
 
-    def __call__(self, request):
-        for r in self.re:
-            if r.search(request.path):
-                return self.re[r](request)
+    def mount(self, plug):
+        """Adds the routes for the API version described by plug"""
+        prefix = self.base + [plug.version]
+        documentator = ApiDocumentator(api=plug.api,
+            auth_methods=plug.auth_methods)
+        self.add_route(prefix + ['doc'], self.get_doc_view(documentator))
+        for name, binding in plug.bindings:
+            if isclass(binding):
+                binding = binding(plug.api)
+            binding_prefix = prefix + split_path(name)
+            for method_name in self.get_method_names(binding):
+                self.add_route(binding_prefix + split_path(method_name),
+                    self.get_binding_view(binding, method_name))
+
+    def get_method_names(self, binding):
+        """Returns the names of all the methods exposed by a binding"""
+        names = set(binding.registry['read'])
+        names.update(binding.registry['write'])
+        batch_name = getattr(binding, 'BATCH_NAME', None)
+        if batch_name:
+            names.add(batch_name)
+        return names
 
-        raise Http404
+    def get_binding_view(self, binding, method_name):
+        """Returns the view for calling a method in a binding"""
+        def view(request, format):
+            if not format:
+                raise Http404
+            return binding(request, method_name, format)
+        return view
+
+    def get_doc_view(self, documentator):
+        """Returns the view for the documentation of a version"""
+        def view(request, format):
+            if format:
+                raise Http404
+            return documentator(request)
+        return view
+
+    def add_route(self, segments, view):
+        """Stores the view for the given path segments in the trie"""
+        node = self.routes
+        for segment in segments:
+            node = node.setdefault(segment, {})
+        node[_VIEW] = view
+
+    def resolve(self, path):
+        """Returns the view for the given path and the requested format,
+        raising Http404 if there's none"""
+        segments = split_path(path)
+        if not segments:
+            raise Http404
+        last = segments.pop()
+        if '.' in last:
+            last, format = last.rsplit('.', 1)
+        else:
+            format = ''
+        segments.append(last)
+
+        node = self.routes
+        for segment in segments:
+            try:
+                node = node[segment]
+            except KeyError:
+                raise Http404
+        try:
+            return node[_VIEW], format
+        except KeyError:
+            raise Http404
+
+    def __call__(self, request):
+        # path_info excludes SCRIPT_NAME, the routes are relative to it
+        view, format = self.resolve(request.path_info)
+        return view(request, format)
@@ -22,12 +22,28 @@
 
 """HTTP $esponses which format object in different formats"""
 
+import zlib
+from itertools import chain
+
+from django.conf import settings
 from django.http import HttpResponse
-from wapi.serializers import serialize, serialize_one
+from django.utils.cache import patch_vary_headers
+from wapi.serializers import serialize, serialize_one, serialize_stream
 from wapi.formatters import UnknownFormat
+from wapi.utils import close_connection_after
 
 _RESPONSES_REGISTRY = {}
 
+COMPRESS_RESPONSES = getattr(settings, 'WAPI_COMPRESS_RESPONSES', False)
+COMPRESSION_MIN_SIZE = getattr(settings, 'WAPI_COMPRESSION_MIN_SIZE', 1024)
+COMPRESSION_LEVEL = getattr(settings, 'WAPI_COMPRESSION_LEVEL', 6)
+# Preferred encodings first. The wbits for gzip make zlib write the gzip
+# header and trailer, HTTP's deflate is the zlib format.
+COMPRESSION_WBITS = (
+    ('gzip', 16 + zlib.MAX_WBITS),
+    ('deflate', zlib.MAX_WBITS),
+)
+
 def get_response(format):
     """Given a format, returns its correspondant response class"""
     try:
@@ -35,6 +51,78 @@ def get_response(format):
     except KeyError:
         raise UnknownFormat
 
+def get_accepted_encodings(header):
+    """Parses an Accept-Encoding header, returning a dict which maps
+    the encodings to their quality values"""
+    encodings = {}
+    for item in (header or '').split(','):
+        parts = item.split(';')
+        encoding = parts[0].strip().lower()
+        if not encoding:
+            continue
+        quality = 1.0
+        for param in parts[1:]:
+            name, sep, value = param.strip().partition('=')
+            if name.strip() == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        encodings[encoding] = quality
+
+    return encodings
+
+def iter_compressed(content, compressor):
+    """Compresses the content chunk by chunk. Every chunk is flushed,
+    so the client can decode the data as soon as it arrives"""
+    for chunk in content:
+        data = compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+        if data:
+            yield data
+
+    yield compressor.flush()
+
+def compress_response(request, response, min_size=None, level=None):
+    """Compresses the content of a successful response with the preferred
+    encoding accepted by the client. String contents smaller than min_size
+    are left alone, while streamed ones are compressed incrementally.
+    Does nothing unless WAPI_COMPRESS_RESPONSES is set"""
+    if not COMPRESS_RESPONSES or response.status_code != 200 or \
+        response.has_header('Content-Encoding'):
+        return response
+
+    patch_vary_headers(response, ('Accept-Encoding', ))
+    streaming = getattr(response, 'streaming', False)
+    if min_size is None:
+        min_size = COMPRESSION_MIN_SIZE
+    if not streaming and len(response.content) < min_size:
+        return response
+
+    accepted = get_accepted_encodings(request.META.get('HTTP_ACCEPT_ENCODING'))
+    for encoding, wbits in COMPRESSION_WBITS:
+        if accepted.get(encoding, accepted.get('*', 0)) > 0:
+            break
+    else:
+        return response
+
+    if level is None:
+        level = COMPRESSION_LEVEL
+    compressor = zlib.compressobj(level, zlib.DEFLATED, wbits)
+    if streaming:
+        # HttpResponse only accepts iterators in its constructor
+        response._container = iter_compressed(response._container, compressor)
+    else:
+        response.content = compressor.compress(response.content) + \
+            compressor.flush()
+        response['Content-Length'] = str(len(response.content))
+
+    response['Content-Encoding'] = encoding
+    if response.has_header('ETag'):
+        # Different encodings of the same entity need different strong ETags
+        response['ETag'] = '%s-%s"' % (response['ETag'][:-1], encoding)
+
+    return response
+
 class SerializableResponse(object):
     """A special class which can be converted to a SerializedResponse"""
     def __init__(self, objs, method=None, *args, **kwargs):
@@ -54,6 +142,14 @@ class SingleSerializableResponse(SerializableResponse):
         return cls(self.objs, self.method, serialize=serialize_one,
             *self.args, **self.kwargs)
 
+class StreamingSerializableResponse(SerializableResponse):
+    """SerializableResponse which produces its content lazily, formatting
+    the objects while the response is being sent"""
+    def transform(self, cls):
+        """Transform using serialize_stream instead of serialize"""
+        return cls(self.objs, self.method, serialize=serialize_stream,
+            *self.args, **self.kwargs)
+
 class SerializedResponseType(type):
     """Metaclass for serialized responses, adds them to the registry"""
     def __init__(mcs, name, bases, dct):
@@ -71,9 +167,18 @@ class SerializedResponse(HttpResponse):
         self.serialize = kwargs.pop('serialize', serialize)
         content = self.serialize(self.__class__.formatter,
             objs, method, *args, **kwargs)
+        self.streaming = not isinstance(content, basestring)
+        content = self.wrap(content)
+        if self.streaming:
+            content = close_connection_after(content)
         super(SerializedResponse, self).__init__(content,
             content_type=self.__class__.content_type)
 
+    def wrap(self, content):
+        """Hook for modifying the content before it's stored in the response.
+        Note that content might be either a string or an iterator"""
+        return content
+
 class JsonResponse(SerializedResponse):
     """Returns objects formatted as JSON. Accepts a 'jscb' parameter, indicating
     the JSONP callback"""
@@ -82,9 +187,16 @@ class JsonResponse(SerializedResponse):
     def __init__(self, objs, method=None, *args, **kwargs):
         self.request = kwargs.pop('request', None)
         super(JsonResponse, self).__init__(objs, method, *args, **kwargs)
+
+    def wrap(self, content):
+        """Wraps the content in the JSONP callback, if any"""
         if self.request and 'jscb' in self.request.REQUEST:
-            self.content = '%s(%s)' % \
-                (self.request.REQUEST['jscb'], self.content)
+            callback = self.request.REQUEST['jscb']
+            if isinstance(content, basestring):
+                return '%s(%s)' % (callback, content)
+            return chain(['%s(' % callback], content, [')'])
+
+        return content
 
 class XmlResponse(SerializedResponse):
     """Returns objects formatted as XML"""
@@ -95,3 +207,18 @@ class YamlResponse(SerializedResponse):
     """Returns objects formatted as YAML"""
     content_type = 'application/x-yaml'
     formatter = 'yaml'
+
+class MsgPackResponse(SerializedResponse):
+    """Returns objects formatted as MessagePack"""
+    content_type = 'application/x-msgpack'
+    formatter = 'msgpack'
+
+class CsvResponse(SerializedResponse):
+    """Returns objects formatted as CSV, one row per object"""
+    content_type = 'text/csv; charset=utf-8'
+    formatter = 'csv'
+
+class TsvResponse(SerializedResponse):
+    """Returns objects formatted as tab separated values"""
+    content_type = 'text/tab-separated-values; charset=utf-8'
+    formatter = 'tsv'
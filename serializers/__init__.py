@@ -20,9 +20,60 @@
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
 # THE SOFTWARE.
 
+import threading
 from functools import wraps
+from inspect import getmro
+from operator import attrgetter
+
+from django.conf import settings
+
 from wapi.formatters import get_formatter
 
+QUERYSET_CHUNK_SIZE = getattr(settings, 'WAPI_QUERYSET_CHUNK_SIZE', 100)
+
+class _Context(threading.local):
+    # Maps object names to the keys requested for them while
+    # serializing with fieldsets. The None key holds the keys for the
+    # top-level objects without a specific fieldset.
+    fieldsets = None
+    # Keys requested for the object being serialized
+    fields = None
+    # The object being serialized, fields only applies to it and not
+    # to the nested data built from its attributes
+    obj = None
+
+_context = _Context()
+
+def _requested_fields(obj):
+    """Returns the keys requested for obj, or None if every key should
+    be included"""
+    if obj is _context.obj:
+        return _context.fields
+    return None
+
+def get_fields():
+    """Returns the set of keys requested for the object being serialized,
+    or None if every key should be included"""
+    return _context.fields
+
+class Lazy(object):
+    """A value which is only computed if its key is requested"""
+    def __init__(self, func, *args, **kwargs):
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+
+    def __call__(self):
+        return self.func(*self.args, **self.kwargs)
+
+def lazy(func, *args, **kwargs):
+    """Defers calling func until the key the result is assigned to is known
+    to be requested. Only defers while serializing with fieldsets, e.g.:
+        S(author=lazy(lambda: include(obj.author)))"""
+    if _context.fieldsets is None:
+        return func(*args, **kwargs)
+    return Lazy(func, *args, **kwargs)
+
 class objname(object):
     def __init__(self, name):
         self.name = name
@@ -31,6 +82,21 @@ class objname(object):
         func.obj_name = self.name
         return func
 
+class related(object):
+    """Declares the relations traversed by a serialization method, so the
+    querysets serialized with it can fetch them in advance. Positional
+    arguments are passed to select_related() and the 'prefetch' keyword
+    argument lists multi-valued relations for prefetch_related(), which
+    is only used when the installed Django supports it"""
+    def __init__(self, *select, **kwargs):
+        self.select = select
+        self.prefetch = kwargs.get('prefetch', ())
+
+    def __call__(self, func):
+        func.select_related = self.select
+        func.prefetch_related = self.prefetch
+        return func
+
 class extends(object):
     def __init__(self, extended):
         self.extended = extended
@@ -42,23 +108,50 @@ class extends(object):
             return d
         if hasattr(func, 'obj_name'):
             new_func.obj_name = func.obj_name
-        return wraps(func)(new_func)
+        new_func = wraps(func)(new_func)
+        # Used by BaseSerializer._compile for flattening extends chains
+        new_func.extended = self.extended
+        new_func.extension = func
+        return new_func
 
 def include(obj, method=None, **kwargs):
     return serialization(obj, method, **kwargs)[1]
 
 def include_list(objs, method=None, **kwargs):
-    try:
-        s = get_object_serialization(objs[0], method)
-    except IndexError:
-        return []
-    return [s.method(obj, **kwargs) for obj in objs]
+    objs = iterate(prepare_queryset(objs, method))
+    return [obj[1] for obj in _iter_serializations(objs, method, **kwargs)]
+
+def include_objects(objs, method=None, **kwargs):
+    """Like include_list, but the objects are considered top-level when
+    applying fieldsets. Meant for envelope serializers"""
+    objs = iterate(prepare_queryset(objs, method))
+    return [obj[1] for obj in _serialize_objects(objs, method, True, kwargs)]
 
 def chain(obj, method=None, **kwargs):
     return dict([serialization(obj, method, **kwargs)])
 
+_PROPERTY_GETTERS = {}
+
+def _property_getter(properties):
+    """Returns a function which retrieves all the given properties from
+    an object as a tuple"""
+    if not properties:
+        return lambda obj: ()
+    if len(properties) == 1:
+        getter = attrgetter(properties[0])
+        return lambda obj: (getter(obj), )
+    return attrgetter(*properties)
+
 def proplist(obj, properties):
-    return dict([(prop, getattr(obj, prop)) for prop in properties])
+    fields = _requested_fields(obj)
+    if fields is not None:
+        properties = [prop for prop in properties if prop in fields]
+    properties = tuple(properties)
+    try:
+        getter = _PROPERTY_GETTERS[properties]
+    except KeyError:
+        getter = _PROPERTY_GETTERS[properties] = _property_getter(properties)
+    return dict(zip(properties, getter(obj)))
 
 def merge(*args, **kwargs):
     """Merges any dictionaries passed as args with kwargs"""
@@ -77,12 +170,16 @@ def empty(obj_name):
     return { obj_name: {} }
 
 _SERIALIZERS_REGISTRY = {}
+# Maps classes to the serializer found walking their MRO
+_SERIALIZERS_CACHE = {}
 
 class Serialization(object):
-    def __init__(self, name, method):
+    def __init__(self, name, method, select_related=(), prefetch_related=()):
         self.name = name
         self.method = method
-    
+        self.select_related = select_related
+        self.prefetch_related = prefetch_related
+
     def apply(self, obj, **kwargs):
         return (self.name, self.method(obj, **kwargs))
 
@@ -95,11 +192,16 @@ class BaseSerializerType(type):
         super(BaseSerializerType, mcs).__init__(name, bases, dct)
         if getattr(mcs, 'serializes', None):
             _SERIALIZERS_REGISTRY[mcs.serializes] = mcs()
+            _SERIALIZERS_CACHE.clear()
             
 class BaseSerializer(object):
     obj_names = {}
+    # Envelopes wrap the top-level objects, so the fieldset for those
+    # doesn't apply to them. See include_objects.
+    envelope = False
     def __init__(self, *args, **kwargs):
         super(BaseSerializer, self).__init__(*args, **kwargs)
+        self._serializations = {}
         for k, v in self.__class__.__dict__.iteritems():
             if hasattr(v, 'obj_name'):
                 self.__class__.obj_names[v] = v.obj_name
@@ -108,18 +210,74 @@ class BaseSerializer(object):
         return self.__class__.obj_names.get(func)
 
     def default(self, obj, **kw):
+        fields = _requested_fields(obj)
         try:
-            return dict([(k, v) for k, v in obj.__dict__.iteritems() if not k.startswith('_')])
+            return dict([(k, v) for k, v in obj.__dict__.iteritems() if not k.startswith('_') and \
+                (fields is None or k in fields)])
         except AttributeError:
             return dict()
 
+    def _flatten(self, func):
+        """Returns the list of bound methods whose results are merged by
+        func, resolving the extends chains"""
+        extended = getattr(func, 'extended', None)
+        if extended is None:
+            return [func]
+        return self._flatten(getattr(self, extended)) + \
+            self._flatten(func.extension.__get__(self, self.__class__))
+
+    def _compile(self, funcs):
+        """Returns a function equivalent to the extends chain flattened
+        in funcs, which calls its methods directly"""
+        if len(funcs) == 1:
+            return funcs[0]
+
+        first, rest = funcs[0], funcs[1:]
+        def extractor(obj, **kwargs):
+            data = first(obj, **kwargs)
+            for extension in rest:
+                data.update(extension(obj, **kwargs))
+            return data
+
+        return extractor
+
+    def _get_relations(self, func, attr, relations=None):
+        """Returns the relations declared with related in func and in the
+        methods of its extends chain. The extends wrappers are included,
+        since related might have been applied to them"""
+        if relations is None:
+            relations = []
+        for relation in getattr(func, attr, ()):
+            if relation not in relations:
+                relations.append(relation)
+        extended = getattr(func, 'extended', None)
+        if extended is not None:
+            self._get_relations(getattr(self, extended), attr, relations)
+            self._get_relations(func.extension, attr, relations)
+        return tuple(relations)
+
     def _get_serialization(self, obj, method):
+        return self._get_class_serialization(obj.__class__, method)
+
+    def _get_class_serialization(self, cls, method):
+        key = (method, cls)
+        try:
+            return self._serializations[key]
+        except KeyError:
+            pass
+
         try:
             m = getattr(self, method or 'default')
         except AttributeError:
             raise NoSerializationMethod('Serialization "%s" is not defined in serializer "%s" for object "%s"' % \
-                (method, _SERIALIZERS_REGISTRY.get(obj.__class__, Serializer).__name__, obj.__class__.__name__))
-        return Serialization(self.obj_name(m) or obj.__class__.__name__.lower(), m)
+                (method, self.__class__.__name__, cls.__name__))
+        funcs = self._flatten(m)
+        serialization = Serialization(self.obj_name(m) or \
+            cls.__name__.lower(), self._compile(funcs),
+            self._get_relations(m, 'select_related'),
+            self._get_relations(m, 'prefetch_related'))
+        self._serializations[key] = serialization
+        return serialization
 
     def _do_serialization(self, obj, method=None, **kw):
         serialization = self._get_serialization(obj, method)
@@ -132,39 +290,180 @@ class DictSerializer(Serializer):
     serializes = {}.__class__
 
     def default(self, obj, **kwargs):
-        return dict([(k, chain(v)) for k, v in obj.iteritems()])
+        fields = _requested_fields(obj)
+        return dict([(k, chain(v)) for k, v in obj.iteritems() \
+            if fields is None or k in fields])
 
 _DEFAULT_SERIALIZER = Serializer()
 
 def get_class_serializer(cls):
+    """Returns the serializer registered for the nearest class in the
+    MRO of cls, or the default serializer if there's none"""
     try:
-        return _SERIALIZERS_REGISTRY[cls]
+        return _SERIALIZERS_CACHE[cls]
     except KeyError:
-        return _DEFAULT_SERIALIZER
+        pass
+
+    serializer = _DEFAULT_SERIALIZER
+    for klass in getmro(cls):
+        if klass in _SERIALIZERS_REGISTRY:
+            serializer = _SERIALIZERS_REGISTRY[klass]
+            break
+
+    _SERIALIZERS_CACHE[cls] = serializer
+    return serializer
 
 def get_object_serialization(obj, method=None):
     ser = get_class_serializer(obj.__class__)
     return ser._get_serialization(obj, method)
 
-def serialize(format, objs, method=None, out=None, **kwargs):
-    fmt = get_formatter(format)(out=out)
+def _is_queryset(objs):
+    return hasattr(objs, 'model') and hasattr(objs, 'iterator')
+
+def _is_evaluated(queryset):
+    return getattr(queryset, '_result_cache', None) is not None
+
+def iterate(objs):
+    """Returns an iterator over objs. Querysets which haven't been evaluated
+    yet are iterated without filling their result cache, so the rows
+    don't stay in memory after being serialized"""
+    if not _is_queryset(objs) or _is_evaluated(objs) or \
+        getattr(objs, '_prefetch_related_lookups', None):
+        return iter(objs)
+
+    try:
+        return objs.iterator(chunk_size=QUERYSET_CHUNK_SIZE)
+    except TypeError:
+        # Django versions without chunk_size use their own
+        return objs.iterator()
+
+def prepare_queryset(objs, method=None):
+    """Makes a queryset fetch in advance the relations declared with related
+    by the serialization used for its model. Other objects and evaluated
+    querysets are returned unchanged"""
+    if not _is_queryset(objs) or _is_evaluated(objs) or \
+        not hasattr(objs, 'select_related'):
+        return objs
+
+    model = objs.model
+
+    serialization = get_class_serializer(model)._get_class_serialization(
+        model, method)
+    if serialization.select_related:
+        objs = objs.select_related(*serialization.select_related)
+    if serialization.prefetch_related and hasattr(objs, 'prefetch_related'):
+        objs = objs.prefetch_related(*serialization.prefetch_related)
+    return objs
+
+def _extract_fields(extract, obj, fields, kwargs):
+    """Serializes obj with the given fields, computing the lazy values
+    only for the requested keys"""
+    previous = _context.fields, _context.obj
+    _context.fields, _context.obj = fields, obj
+    try:
+        data = extract(obj, **kwargs)
+        if fields is None:
+            for key, value in data.items():
+                if isinstance(value, Lazy):
+                    data[key] = value()
+            return data
+
+        pruned = {}
+        for key in fields:
+            if key in data:
+                value = data[key]
+                if isinstance(value, Lazy):
+                    value = value()
+                pruned[key] = value
+        return pruned
+    finally:
+        _context.fields, _context.obj = previous
+
+def _get_fieldset(name, top_level):
+    """Returns the fields requested for an object with the given name"""
+    fieldsets = _context.fieldsets
+    if top_level:
+        return fieldsets.get(name, fieldsets.get(None))
+    return fieldsets.get(name)
+
+def _serialize_objects(objs, method, top_level, kwargs):
+    """Yields the serialization of every object, resolving it only once
+    for each distinct class"""
+    serializations = {}
+    for obj in objs:
+        try:
+            name, extract, top = serializations[obj.__class__]
+        except KeyError:
+            serialization = get_object_serialization(obj, method)
+            top = top_level and not get_class_serializer(obj.__class__).envelope
+            name, extract, top = serializations[obj.__class__] = \
+                (serialization.name, serialization.method, top)
+        if _context.fieldsets is None:
+            yield (name, extract(obj, **kwargs))
+        else:
+            yield (name, _extract_fields(extract, obj,
+                _get_fieldset(name, top), kwargs))
+
+def _iter_serializations(objs, method=None, **kwargs):
+    return _serialize_objects(objs, method, False, kwargs)
+
+def _with_fieldsets(fieldsets, iterable):
+    """Iterates over iterable while the given fieldsets are active. They're
+    only set while the iterable is advanced, since streamed responses are
+    consumed after the view returns"""
+    iterator = iter(iterable)
+    while True:
+        previous = _context.fieldsets
+        _context.fieldsets = fieldsets
+        try:
+            try:
+                item = iterator.next()
+            except StopIteration:
+                return
+        finally:
+            _context.fieldsets = previous
+        yield item
+
+def _iter_top_level(objs, method, fields, kwargs):
+    """Yields the serializations of the top-level objects. fields maps the
+    object names to the requested keys, see parse_fieldsets"""
+    if not fields:
+        return _serialize_objects(objs, method, False, kwargs)
+    return _with_fieldsets(fields, _serialize_objects(objs, method, True, kwargs))
+
+def serialize(format, objs, method=None, out=None, fields=None, columns=None,
+    **kwargs):
+    fmt = get_formatter(format)(out=out, columns=columns)
     fmt.start()
+    objs = iterate(prepare_queryset(objs, method))
+    serializations = list(_iter_top_level(objs, method, fields, kwargs))
 
-    if len(objs) == 0:
-        fmt.empty()
+    if serializations:
+        fmt.format_list(serializations)
     else:
-        fmt.format_list([get_object_serialization(objs, method).apply(obj, **kwargs) for obj in objs])
+        fmt.empty()
     fmt.end()
     return fmt.get()
 
-def serialize_one(format, obj, method, out=None, **kwargs):
-    fmt = get_formatter(format)(out=out)
+def serialize_stream(format, objs, method=None, chunk_size=None, fields=None,
+    columns=None, **kwargs):
+    """Like serialize, but returns an iterator which serializes and formats
+    the objects as it's consumed"""
+    fmt = get_formatter(format)(chunk_size=chunk_size, columns=columns)
+    fmt.start()
+    objs = iterate(prepare_queryset(objs, method))
+    return fmt.stream_list(_iter_top_level(objs, method, fields, kwargs))
+
+def serialize_one(format, obj, method, out=None, fields=None, columns=None,
+    **kwargs):
+    fmt = get_formatter(format)(out=out, columns=columns)
     fmt.start()
-    serialization = get_object_serialization(obj, method)
-    fmt.format(serialization.apply(obj, **kwargs))
+    fmt.format(list(_iter_top_level([obj], method, fields, kwargs))[0])
     fmt.end()
     return fmt.get()
 
 def serialization(obj, method=None, **kwargs):
-    return get_object_serialization(obj, method).apply(obj, **kwargs)
+    if _context.fieldsets is None:
+        return get_object_serialization(obj, method).apply(obj, **kwargs)
+    return list(_iter_serializations([obj], method, **kwargs))[0]
 
@@ -22,9 +22,26 @@
 
 """Functions for shortcutting some tasks in Wapi"""
 
+from base64 import urlsafe_b64encode, urlsafe_b64decode
+
+try:
+    from django.utils import simplejson
+except ImportError:
+    import simplejson
+
+from django.conf import settings
+from django.db.models import Q
+from django.db.models.fields import FieldDoesNotExist
 from django.shortcuts import _get_queryset
+from django.utils.encoding import smart_unicode
+
+from wapi.exceptions import ApiEmpty, ApiInvalidParam
+from wapi.serializers import Serializer, include_objects
+from wapi.utils import sign, unsign
 
-from wapi.exceptions import ApiEmpty
+DEFAULT_PAGE_SIZE = getattr(settings, 'WAPI_PAGE_SIZE', 20)
+MAX_PAGE_SIZE = getattr(settings, 'WAPI_MAX_PAGE_SIZE', 100)
+CURSOR_SALT = 'wapi.cursor'
 
 def get_object_or_empty(klass, *args, **kwargs):
     """Raises ApiEmpty if the object cannot be found"""
@@ -41,3 +58,135 @@ def get_list_or_empty(klass, *args, **kwargs):
     if not obj_list:
         raise ApiEmpty
     return obj_list
+
+class Page(object):
+    """A page of objects retrieved with get_page_or_empty. Its serialization
+    includes the objects and the cursor for the next page, if any, so it
+    should be returned in a SingleSerializableResponse"""
+    def __init__(self, objects, next_cursor=None, method=None):
+        self.objects = objects
+        self.next_cursor = next_cursor
+        self.method = method
+
+class PageSerializer(Serializer):
+    serializes = Page
+    envelope = True
+
+    def default(self, page, **kwargs):
+        data = {'objects': include_objects(page.objects, page.method, **kwargs)}
+        if page.next_cursor:
+            data['next'] = page.next_cursor
+        return data
+
+def _get_ordering(ordering):
+    """Returns the ordering, making sure it ends with the primary key
+    so every position is unique"""
+    ordering = list(ordering)
+    names = [field.lstrip('-') for field in ordering]
+    for name in names:
+        if '__' in name:
+            raise RuntimeError('Cursor pagination can\'t order by fields ' \
+                'of related models ("%s")' % name)
+    if 'pk' not in names and 'id' not in names:
+        if ordering and ordering[0].startswith('-'):
+            ordering.append('-pk')
+        else:
+            ordering.append('pk')
+    return ordering
+
+def _get_order_by(model, ordering):
+    """Returns the arguments for order_by. Foreign keys are ordered by the
+    id of the related object, like the cursors store them, instead of by
+    the ordering of the related model"""
+    order_by = []
+    for field in ordering:
+        name = field.lstrip('-')
+        try:
+            model_field = model._meta.get_field(name)
+        except FieldDoesNotExist:
+            pass
+        else:
+            if model_field.attname != model_field.name:
+                field = '%s__pk' % field
+        order_by.append(field)
+    return order_by
+
+def encode_cursor(ordering, obj):
+    """Returns a signed cursor pointing after obj in the given ordering"""
+    values = []
+    for field in ordering:
+        name = field.lstrip('-')
+        try:
+            # Foreign keys are stored as the id of the related object
+            name = obj._meta.get_field(name).attname
+        except FieldDoesNotExist:
+            pass
+        value = getattr(obj, name)
+        if not isinstance(value, (int, long, float, basestring)):
+            value = smart_unicode(value)
+        values.append(value)
+
+    payload = simplejson.dumps([ordering, values])
+    return urlsafe_b64encode(sign(payload, CURSOR_SALT))
+
+def decode_cursor(ordering, cursor):
+    """Returns the ordering key values stored in a cursor, raising
+    ApiInvalidParam if it's not valid for the given ordering"""
+    try:
+        payload = unsign(urlsafe_b64decode(str(cursor)), CURSOR_SALT)
+        cursor_ordering, values = simplejson.loads(payload)
+    except (TypeError, ValueError, UnicodeError):
+        raise ApiInvalidParam(param='cursor', value=cursor)
+
+    if cursor_ordering != ordering or len(values) != len(ordering):
+        raise ApiInvalidParam(param='cursor', value=cursor)
+
+    return values
+
+def _get_keyset_filter(ordering, values):
+    """Returns a Q object selecting the rows after values in the ordering"""
+    keyset = None
+    for index, field in enumerate(ordering):
+        name = str(field.lstrip('-'))
+        lookup = field.startswith('-') and 'lt' or 'gt'
+        condition = Q(**{'%s__%s' % (name, lookup): values[index]})
+        for previous, value in zip(ordering[:index], values[:index]):
+            condition &= Q(**{str(previous.lstrip('-')): value})
+        if keyset is None:
+            keyset = condition
+        else:
+            keyset |= condition
+    return keyset
+
+def get_page_or_empty(klass, ordering, cursor=None, limit=None, method=None,
+    *args, **kwargs):
+    """Returns a Page with at most limit objects matching the given filters,
+    starting after the position encoded in cursor. Unlike offset paging,
+    the cost of the query doesn't depend on how deep the page is. ordering
+    is a list of fields like in order_by; the primary key is appended if
+    needed and the ordering fields can't be NULL. method is used for
+    serializing the objects. Raises ApiEmpty if the page is empty and
+    ApiInvalidParam if limit isn't positive"""
+    ordering = _get_ordering(ordering)
+    if limit is None:
+        limit = DEFAULT_PAGE_SIZE
+    elif limit <= 0:
+        raise ApiInvalidParam(param='limit', value=limit)
+    limit = min(limit, MAX_PAGE_SIZE)
+    queryset = _get_queryset(klass).filter(*args, **kwargs)
+    if cursor:
+        queryset = queryset.filter(_get_keyset_filter(ordering,
+            decode_cursor(ordering, cursor)))
+
+    # Fetch an additional object to know if there's a next page
+    objects = list(queryset.order_by(
+        *_get_order_by(queryset.model, ordering))[:limit + 1])
+    if not objects:
+        raise ApiEmpty
+
+    next_cursor = None
+    if len(objects) > limit:
+        objects = objects[:limit]
+        next_cursor = encode_cursor(ordering, objects[-1])
+
+    return Page(objects, next_cursor, method)
@@ -1,4 +1,4 @@
-#!/bin/sh
+# -*- coding: utf-8 -*-
 
 # Copyright (c) 2008 Alberto García Hierro <fiam@rm-fr.net>
 
@@ -20,25 +20,13 @@
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
 # THE SOFTWARE.
 
-set -e
+"""Tests for Wapi. Run them with the Django test runner or with
+python -m unittest"""
 
-PYCJSON_VERSION="1.0.3x6"
-PYCJSON_NAME="python-cjson"
-PYCJSON="${PYCJSON_NAME}-${PYCJSON_VERSION}"
-PYCJSON_TGZ="${PYCJSON}.tar.gz"
-PYCJSON_URL="http://abra.rm-fr.net/~fiam/code/3rdparty/${PYCJSON_NAME}/${PYCJSON_TGZ}"
-PYCJSON_PATCH_URL="http://abra.rm-fr.net/~fiam/code/${PYCJSON}+datetime+decimal-warnings.patch"
-
-if test `basename $PWD` != "wapi"; then
-    echo "Run this script from the wapi root directory" 1>&2
-fi
-
-wget ${PYCJSON_URL}
-tar xzf ${PYCJSON_TGZ}
-rm -f ${PYCJSON_TGZ}
-cd ${PYCJSON}
-wget -O - ${PYCJSON_PATCH_URL}|patch -p1
-python setup.py build
-mv build/lib*/cjson.so ../
-cd ..
-rm -fr ${PYCJSON}
+from wapi.tests.serializers import *
+from wapi.tests.json_backends import *
+from wapi.tests.yaml_formatter import *
+from wapi.tests.bindings import *
+from wapi.tests.csv_formatter import *
+from wapi.tests.digest import *
+from wapi.tests.plug import *
@@ -0,0 +1,134 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2008 Alberto García Hierro <fiam@rm-fr.net>
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+
+"""Tests for the ReST binding"""
+
+import unittest
+
+try:
+    from django.utils import simplejson
+except ImportError:
+    import simplejson
+
+from django.core.signals import request_finished
+from django.db import connection
+
+from wapi.bindings import RestBinding
+from wapi.decorators import readonly, writeonly, optional_parameter
+from wapi.responses import SerializableResponse, get_response
+
+class User(object):
+    def is_authenticated(self):
+        return True
+
+class Request(object):
+    def __init__(self, method='GET', GET=None, POST=None):
+        self.method = method
+        self.GET = GET or {}
+        self.POST = POST or {}
+        self.REQUEST = dict(self.GET, **self.POST)
+        self.META = {}
+        self.user = User()
+
+class Item(object):
+    def __init__(self, name):
+        self.name = name
+
+class Record(object):
+    def __init__(self, name):
+        self.name = name
+        self.kind = 'record'
+
+class Api(object):
+    def __init__(self):
+        self.created = []
+
+    @writeonly
+    def create(self, request, dct):
+        self.created.append(dct['name'])
+        return SerializableResponse([Item(dct['name'])])
+
+    @readonly
+    def gen(self, request, dct):
+        for name in self.created:
+            yield Item(name)
+
+    @readonly
+    def items(self, request, dct):
+        return SerializableResponse([Record('a')])
+
+    @readonly
+    @optional_parameter('fields', str)
+    def search(self, request, dct):
+        return SerializableResponse([Record(dct['fields'])])
+
+class StreamingTest(unittest.TestCase):
+    def setUp(self):
+        self.closed = []
+        connection.close = lambda: self.closed.append(True)
+        self.api = Api()
+        self.binding = RestBinding(self.api)
+
+    def tearDown(self):
+        del connection.close
+
+    def test_batch_keeps_connection(self):
+        calls = [{'method': 'create', 'verb': 'POST', 'params': {'name': 'b'}},
+            {'method': 'gen'}]
+        request = Request('POST', POST={'calls': simplejson.dumps(calls)})
+        response = self.binding.batch(request, 'json', get_response('json'))
+        results = simplejson.loads(response.content)
+        self.assertEqual([result['status'] for result in results], [200, 200])
+        self.assertEqual(simplejson.loads(results[1]['body']),
+            [{'name': 'b'}])
+        # Closing the connection would roll back the uncommitted write
+        self.assertEqual(self.closed, [])
+
+    def test_stream_closes_connection_after_request(self):
+        self.api.created.append('a')
+        response = self.binding.call_method(Request(),
+            self.binding.get_method('read', 'gen'), {}, 'json',
+            get_response('json'))
+        request_finished.send(sender=self.__class__)
+        self.assertEqual(self.closed, [])
+        self.assertEqual(simplejson.loads(''.join(response)), [{'name': 'a'}])
+        self.assertEqual(self.closed, [True])
+
+class BindingFieldsetsTest(unittest.TestCase):
+    def call(self, name, dct):
+        binding = RestBinding(Api())
+        response = binding.call_method(Request(GET=dct),
+            binding.get_method('read', name), dct, 'json',
+            get_response('json'))
+        return simplejson.loads(response.content)
+
+    def test_fields(self):
+        self.assertEqual(self.call('items', {'fields': 'name'}),
+            [{'name': 'a'}])
+
+    def test_declared_fields_parameter(self):
+        self.assertEqual(self.call('search', {'fields': 'name'}),
+            [{'name': 'name', 'kind': 'record'}])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2008 Alberto García Hierro <fiam@rm-fr.net>
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+
+"""Tests for the CSV and TSV formatters"""
+
+import unittest
+from decimal import Decimal
+
+from wapi.exceptions import ApiBadRequest
+from wapi.formatters.csv_formatter import CsvFormatter, TsvFormatter, \
+    TabularDataError
+
+def format_list(data, cls=CsvFormatter, **kwargs):
+    formatter = cls(**kwargs)
+    formatter.format_list(data)
+    return formatter.get()
+
+class CsvFormatterTest(unittest.TestCase):
+    def test_escaping(self):
+        data = [('row', {'text': u'a, "b"\nc', 'name': u'caf\xe9'})]
+        self.assertEqual(format_list(data),
+            'name,text\r\ncaf\xc3\xa9,"a, ""b""\nc"\r\n')
+
+    def test_tsv(self):
+        data = [('row', {'a': 'x\ty', 'b': 'z'})]
+        self.assertEqual(format_list(data, TsvFormatter),
+            'a\tb\r\n"x\ty"\tz\r\n')
+
+    def test_values(self):
+        data = [('row', {'big': 12345678901234.5, 'precise': 1.2345678901234567,
+            'decimal': Decimal('0.10'), 'none': None, 'number': 3})]
+        self.assertEqual(format_list(data),
+            'big,decimal,none,number,precise\r\n'
+            '12345678901234.5,0.10,,3,1.2345678901234567\r\n')
+
+    def test_flattening(self):
+        data = [('row', {'id': 1, 'author': {'name': 'a', 'address':
+            {'city': 'c'}}})]
+        self.assertEqual(format_list(data),
+            'author.address.city,author.name,id\r\nc,a,1\r\n')
+
+    def test_columns(self):
+        data = [('row', {'a': 1, 'b': 2}), ('row', {'a': 3, 'c': 4})]
+        self.assertEqual(format_list(data, columns=['c', 'a']),
+            'c,a\r\n,1\r\n4,3\r\n')
+
+    def test_rejects_lists(self):
+        data = [('row', {'a': [1, 2]})]
+        self.assertRaises(TabularDataError, format_list, data)
+
+    def test_rejects_extra_columns(self):
+        data = [('row', {'a': 1}), ('row', {'a': 2, 'b': 3})]
+        self.assertRaises(TabularDataError, format_list, data)
+
+    def test_error_is_bad_request(self):
+        self.failUnless(issubclass(TabularDataError, ApiBadRequest))
+
+    def test_stream_checks_first_row(self):
+        data = [('row', {'a': [1]})]
+        self.assertRaises(TabularDataError, CsvFormatter().stream_list,
+            iter(data))
+        self.assertRaises(TabularDataError, CsvFormatter(columns=['a']).\
+            stream_list, iter(data))
+
+    def test_stream(self):
+        data = [('row', {'a': i}) for i in range(3)]
+        self.assertEqual(''.join(CsvFormatter(chunk_size=1).stream_list(
+            iter(data))), format_list(data))
+
+    def test_empty(self):
+        formatter = CsvFormatter(columns=['a', 'b'])
+        formatter.empty()
+        self.assertEqual(formatter.get(), 'a,b\r\n')
+
+if __name__ == '__main__':
+    unittest.main()
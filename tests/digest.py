@@ -0,0 +1,154 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2008 Alberto García Hierro <fiam@rm-fr.net>
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+
+"""Tests for the digest authentication"""
+
+import time
+import hashlib
+import unittest
+
+from wapi.auth import digest
+from wapi.auth.digest import ApiAuthDigest, get_digest, get_HA2, make_nonce, \
+    split_into_dict
+
+# RFC 2617, section 3.5
+REALM = 'testrealm@host.com'
+USERNAME = 'Mufasa'
+PASSWORD = 'Circle Of Life'
+URI = '/dir/index.html'
+RFC_NONCE = 'dcd98b7102dd2f0e8b11d0f600bfb0c093'
+RFC_CNONCE = '0a4f113b'
+RFC_RESPONSE = '6629fae49393a05397450978507c4ef1'
+
+def get_ha1(username, realm, password):
+    return hashlib.md5('%s:%s:%s' % (username, realm, password)).hexdigest()
+
+class User(object):
+    class DoesNotExist(Exception):
+        pass
+
+    class objects(object):
+        @staticmethod
+        def get(username):
+            if username != USERNAME:
+                raise User.DoesNotExist
+            return User()
+
+    username = USERNAME
+    password = 'sha1$salt$hash'
+
+class Request(object):
+    method = 'GET'
+
+    def __init__(self, authorization):
+        self.META = {'HTTP_AUTHORIZATION': authorization}
+        self.user = None
+
+    def get_full_path(self):
+        return URI
+
+class Auth(ApiAuthDigest):
+    realm = REALM
+
+    def get_HA1(self, request, realm, user):
+        return get_ha1(user.username, realm, PASSWORD)
+
+class DigestTest(unittest.TestCase):
+    def setUp(self):
+        self.user_class = digest.User
+        digest.User = User
+        self.auth = Auth()
+        # Every test uses its own client nonce, so the cache doesn't
+        # remember the counts used by other tests
+        self.cnonce = hashlib.md5(str(time.time()) + self.id()).hexdigest()
+
+    def tearDown(self):
+        digest.User = self.user_class
+
+    def login(self, nonce, nc, realm=REALM, password=PASSWORD):
+        response = get_digest(get_ha1(USERNAME, realm, password), nonce, nc,
+            self.cnonce, 'auth', get_HA2('GET', URI))
+        request = Request('Digest username="%s", realm="%s", nonce="%s", ' \
+            'uri="%s", qop=auth, nc=%s, cnonce="%s", response="%s", ' \
+            'opaque="%s"' % (USERNAME, realm, nonce, URI, nc, self.cnonce,
+            response, self.auth.get_opaque()))
+        return request, self.auth.login(request)
+
+    def assertChallenge(self, response, stale):
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual('stale="true"' in response['WWW-Authenticate'], stale)
+
+    def test_rfc_vector(self):
+        ha1 = get_ha1(USERNAME, REALM, PASSWORD)
+        self.assertEqual(get_digest(ha1, RFC_NONCE, '00000001', RFC_CNONCE,
+            'auth', get_HA2('GET', URI)), RFC_RESPONSE)
+
+    def test_challenge(self):
+        response = self.auth.login_required(None)
+        self.assertChallenge(response, False)
+        params = split_into_dict(response['WWW-Authenticate'][len('Digest '):])
+        self.assertEqual(params['realm'], REALM)
+        self.assertEqual(params['qop'], 'auth')
+
+    def test_valid_nonce(self):
+        nonce = make_nonce(REALM)
+        for nc in ('00000001', '00000002'):
+            request, response = self.login(nonce, nc)
+            self.assertEqual(response, None)
+            self.assertEqual(request.user.username, USERNAME)
+
+    def test_replayed_nc(self):
+        nonce = make_nonce(REALM)
+        request, response = self.login(nonce, '00000001')
+        self.assertEqual(response, None)
+        request, response = self.login(nonce, '00000001')
+        self.assertChallenge(response, True)
+        self.assertEqual(request.user, None)
+
+    def test_expired_nonce(self):
+        nonce = make_nonce(REALM, time.time() - Auth.nonce_ttl - 10)
+        request, response = self.login(nonce, '00000001')
+        self.assertChallenge(response, True)
+        self.assertEqual(request.user, None)
+
+    def test_wrong_password(self):
+        request, response = self.login(make_nonce(REALM), '00000001',
+            password='wrong')
+        self.assertChallenge(response, False)
+        self.assertEqual(request.user, None)
+
+    def test_nonce_from_another_realm(self):
+        nonce = make_nonce('otherrealm')
+        request, response = self.login(nonce, '00000001')
+        self.assertChallenge(response, False)
+        self.assertEqual(request.user, None)
+
+    def test_tampered_nonce(self):
+        nonce = make_nonce(REALM)
+        tampered = '%x' % (int(nonce[:-40], 16) + 1000) + nonce[-40:]
+        request, response = self.login(tampered, '00000001')
+        self.assertChallenge(response, False)
+        self.assertEqual(request.user, None)
+
+if __name__ == '__main__':
+    unittest.main()
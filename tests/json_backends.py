@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2008 Alberto García Hierro <fiam@rm-fr.net>
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+
+"""Conformance tests for the JSON backends. Every installed backend must
+produce the same output"""
+
+import unittest
+from datetime import datetime, timedelta, tzinfo
+from decimal import Decimal
+
+from wapi.formatters.json_formatter import JSON_BACKENDS, get_json_backend, \
+    get_encode
+
+class FixedOffset(tzinfo):
+    def __init__(self, minutes):
+        self.offset = timedelta(minutes=minutes)
+
+    def utcoffset(self, dt):
+        return self.offset
+
+    def dst(self, dt):
+        return timedelta(0)
+
+DATA = (
+    Decimal('3.25'),
+    Decimal('-0.1'),
+    datetime(2008, 10, 21, 9, 5, 3),
+    datetime(2008, 10, 21, 23, 59, 59, tzinfo=FixedOffset(-150)),
+    u'caf\xe9 € "quoted" \\ \n',
+    'plain',
+    {'amount': Decimal('10.5'), 'created': datetime(2009, 1, 1),
+        'name': u'Jos\xe9', 'tags': [u'\xf1', 1, 2.5, None, True]},
+    [{'nested': {'list': [Decimal('1'), [datetime(2000, 2, 29)]]}}, []],
+)
+
+def get_installed_backends():
+    backends = []
+    for name, load in JSON_BACKENDS:
+        try:
+            backends.append(get_json_backend(name))
+        except RuntimeError:
+            pass
+    return backends
+
+class JsonBackendsTest(unittest.TestCase):
+    def test_identical_output(self):
+        backends = get_installed_backends()
+        self.failUnless(backends)
+        for value in DATA:
+            outputs = [(name, get_encode(module)(value)) \
+                for name, module in backends]
+            expected = outputs[0][1]
+            for name, output in outputs[1:]:
+                self.assertEqual(output, expected, '%s: %r != %s: %r' % \
+                    (name, output, outputs[0][0], expected))
+
+    def test_decimal_and_datetime(self):
+        for name, module in get_installed_backends():
+            encode = get_encode(module)
+            self.assertEqual(encode(Decimal('3.25')), '3.25')
+            self.assertEqual(encode(datetime(2008, 10, 21, 9, 5, 3)),
+                '"Tue, 21 Oct 2008 09:05:03 "')
+
+    def test_unknown_backend(self):
+        self.assertRaises(RuntimeError, get_json_backend, 'nonexistent')
+
+if __name__ == '__main__':
+    unittest.main()
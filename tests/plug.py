@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2008 Alberto García Hierro <fiam@rm-fr.net>
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+
+"""Tests for ApiPlug"""
+
+import unittest
+
+from django.http import Http404
+
+from wapi.bindings import RestBinding
+from wapi.plug import ApiPlug
+
+class Api(object):
+    def user__get(self, request, dct):
+        pass
+
+class Binding(RestBinding):
+    def __call__(self, request, method_name, format):
+        return method_name, format
+
+class Plug(ApiPlug):
+    api = Api
+    bindings = [('rest', Binding)]
+
+class Request(object):
+    def __init__(self, script_name, path_info):
+        self.path = script_name + path_info
+        self.path_info = path_info
+
+class PlugTest(unittest.TestCase):
+    def setUp(self):
+        self.plug = Plug('/api/')
+
+    def test_resolve(self):
+        self.assertEqual(self.plug(Request('', '/api/1.0/rest/user/get.json')),
+            ('user/get', 'json'))
+        self.assertEqual(self.plug(Request('', '/api/1.0/rest/batch.xml')),
+            ('batch', 'xml'))
+
+    def test_script_name(self):
+        request = Request('/prefix', '/api/1.0/rest/user/get.json')
+        self.assertEqual(self.plug(request), ('user/get', 'json'))
+
+    def test_not_found(self):
+        for path in ('/api/1.0/rest/user.json', '/api/1.0/rest/user/get',
+            '/api/2.0/rest/user/get.json', '/'):
+            self.assertRaises(Http404, self.plug, Request('', path))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2008 Alberto García Hierro <fiam@rm-fr.net>
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+import unittest
+
+try:
+    from django.utils import simplejson
+except ImportError:
+    import simplejson
+
+from wapi.serializers import Serializer, serialize, proplist, related, \
+    extends, get_class_serializer
+
+class Author(object):
+    def __init__(self, name, email):
+        self.name = name
+        self.email = email
+
+class Book(object):
+    def __init__(self, id, title, author):
+        self.id = id
+        self.title = title
+        self.author = author
+
+class BookSerializer(Serializer):
+    serializes = Book
+
+    def default(self, obj, **kwargs):
+        d = proplist(obj, ('id', 'title'))
+        d['author'] = proplist(obj.author, ('name', 'email'))
+        return d
+
+class FieldsetsTest(unittest.TestCase):
+    def setUp(self):
+        self.book = Book(1, 'Dune', Author('Frank', 'frank@example.com'))
+
+    def serialize(self, fields):
+        return simplejson.loads(serialize('json', [self.book], fields=fields))
+
+    def test_all_fields(self):
+        self.assertEqual(self.serialize(None), [{'id': 1, 'title': 'Dune',
+            'author': {'name': 'Frank', 'email': 'frank@example.com'}}])
+
+    def test_top_level_fields(self):
+        self.assertEqual(self.serialize({None: set(['id'])}), [{'id': 1}])
+
+    def test_nested_proplist(self):
+        """The fieldset for the book must not apply to the author"""
+        self.assertEqual(self.serialize({None: set(['id', 'author'])}),
+            [{'id': 1,
+            'author': {'name': 'Frank', 'email': 'frank@example.com'}}])
+
+class Review(object):
+    def __init__(self, book):
+        self.book = book
+
+class ReviewSerializer(Serializer):
+    serializes = Review
+
+    @related('book')
+    def default(self, obj, **kwargs):
+        return {}
+
+    @related('book__author')
+    @extends('default')
+    def related_above(self, obj, **kwargs):
+        return {}
+
+    @extends('default')
+    @related('book__author')
+    def related_below(self, obj, **kwargs):
+        return {}
+
+class RelatedTest(unittest.TestCase):
+    def get_select_related(self, method):
+        serializer = get_class_serializer(Review)
+        return serializer._get_class_serialization(Review,
+            method).select_related
+
+    def test_related(self):
+        self.assertEqual(self.get_select_related(None), ('book', ))
+
+    def test_related_above_extends(self):
+        self.assertEqual(self.get_select_related('related_above'),
+            ('book__author', 'book'))
+
+    def test_related_below_extends(self):
+        self.assertEqual(self.get_select_related('related_below'),
+            ('book__author', 'book'))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,120 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2008 Alberto García Hierro <fiam@rm-fr.net>
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+
+"""Tests checking the YAML formatter produces the same output as the
+SafeDumper based dumper used by wapi 0.2"""
+
+import unittest
+from datetime import datetime, timedelta, tzinfo
+from decimal import Decimal
+
+import yaml
+
+from wapi.formatters.yaml_formatter import Dumper, PyDumper, YamlFormatter, \
+    PyYamlFormatter
+
+class OldDumper(yaml.dumper.SafeDumper):
+    """The dumper from wapi 0.2"""
+    def represent_decimal(self, value):
+        return self.represent_scalar(u'tag:yaml.org,2002:float', str(value))
+
+    def represent_datetime(self, value):
+        return self.represent_unicode(value.strftime('%a, %d %b %Y %H:%M:%S %z'))
+
+OldDumper.add_representer(Decimal, OldDumper.represent_decimal)
+OldDumper.add_representer(datetime, OldDumper.represent_datetime)
+OldDumper.add_representer((x for x in []).__class__, OldDumper.represent_list)
+
+class FixedOffset(tzinfo):
+    def __init__(self, minutes):
+        self.offset = timedelta(minutes=minutes)
+
+    def utcoffset(self, dt):
+        return self.offset
+
+    def dst(self, dt):
+        return timedelta(0)
+
+def get_objects():
+    """Returns a list of (name, value) pairs, like the formatters receive"""
+    return [
+        ('price', Decimal('3.25')),
+        ('created', datetime(2008, 10, 21, 9, 5, 3)),
+        ('updated', datetime(2008, 10, 21, 23, 59, 59,
+            tzinfo=FixedOffset(-150))),
+        ('item', {'name': u'caf\xe9', 'price': Decimal('-0.10'),
+            'dates': [datetime(2000, 2, 29), datetime(1999, 12, 31, 23)],
+            'ids': (x for x in (1, 2, 3)), 'empty': [], 'none': None}),
+        ('items', [{'amount': Decimal('1')}, {'amount': Decimal('2.5')},
+            {'amount': Decimal('1E+2')}, {'amount': Decimal('Infinity')}]),
+    ]
+
+def old_format(data):
+    return yaml.dump({data[0]: data[1]}, Dumper=OldDumper)
+
+def old_format_list(data):
+    return yaml.dump(({obj[0]: obj[1]} for obj in data), Dumper=OldDumper)
+
+class YamlParityTest(unittest.TestCase):
+    def check_dumper(self, dumper):
+        for obj, old in zip(get_objects(), get_objects()):
+            self.assertEqual(yaml.dump({obj[0]: obj[1]}, Dumper=dumper),
+                old_format(old))
+
+    def test_dumper(self):
+        self.check_dumper(Dumper)
+
+    def test_py_dumper(self):
+        self.check_dumper(PyDumper)
+
+    def check_formatter(self, cls):
+        for obj, old in zip(get_objects(), get_objects()):
+            formatter = cls()
+            formatter.format(obj)
+            self.assertEqual(formatter.get(), old_format(old))
+
+        formatter = cls()
+        formatter.format_list(get_objects())
+        self.assertEqual(formatter.get(), old_format_list(get_objects()))
+
+    def test_formatter(self):
+        self.check_formatter(YamlFormatter)
+
+    def test_py_formatter(self):
+        self.check_formatter(PyYamlFormatter)
+
+    def check_stream_list(self, cls):
+        expected = old_format_list(get_objects())
+        for chunk_size in (1, 16384):
+            formatter = cls(chunk_size=chunk_size)
+            data = (obj for obj in get_objects())
+            self.assertEqual(''.join(formatter.stream_list(data)), expected)
+
+    def test_stream_list(self):
+        self.check_stream_list(YamlFormatter)
+
+    def test_py_stream_list(self):
+        self.check_stream_list(PyYamlFormatter)
+
+if __name__ == '__main__':
+    unittest.main()
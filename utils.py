@@ -22,7 +22,20 @@
 
 """Some utility functions used by Wapi"""
 
+import re
+import sys
+import hmac
+import time
+import calendar
+import hashlib
+import threading
+from Queue import Queue, Empty
+from datetime import datetime
+from email.Utils import formatdate, parsedate_tz, mktime_tz
 from inspect import isclass
+from itertools import chain
+
+FIELDSET_RE = re.compile(r'^fields\[(\w+)\]$')
 
 def is_api_function(func):
     """Returns True if the passed function is a an API function"""
@@ -46,3 +59,208 @@ def get_instance(obj_or_cls):
         return [get_instance(o) for o in obj_or_cls]
 
     return obj_or_cls
+
+# Encodings appended to the ETags of compressed responses
+ETAG_ENCODINGS = ('gzip', 'deflate')
+
+def get_etag(content):
+    """Returns a strong ETag for the given content"""
+    return '"%s"' % hashlib.md5(content).hexdigest()
+
+def etag_matches(etag, header):
+    """Wheter the given ETag matches any of the ones in the value of an
+    If-None-Match header. Uses weak comparison, as required by RFC 2616,
+    and ignores the suffix added to the ETags of compressed responses"""
+    if not header:
+        return False
+
+    for candidate in header.split(','):
+        candidate = candidate.strip()
+        if candidate.startswith('W/'):
+            candidate = candidate[2:]
+        for encoding in ETAG_ENCODINGS:
+            suffix = '-%s"' % encoding
+            if candidate.endswith(suffix):
+                candidate = candidate[:-len(suffix)] + '"'
+        if candidate == '*' or candidate == etag:
+            return True
+
+    return False
+
+def params_repr(dct):
+    """Returns a stable representation of a parameter dictionary"""
+    if hasattr(dct, 'lists'):
+        params = dct.lists()
+    else:
+        params = dct.items()
+    params.sort()
+    return repr(params)
+
+def to_timestamp(value):
+    """Converts a datetime to seconds since the epoch. Naive datetimes
+    are assumed to be in local time"""
+    if isinstance(value, datetime):
+        if value.tzinfo is None:
+            return int(time.mktime(value.timetuple()))
+        return calendar.timegm(value.utctimetuple())
+
+    return int(value)
+
+def http_date(timestamp):
+    """Formats a timestamp as required by the HTTP headers"""
+    return formatdate(timestamp, usegmt=True)
+
+def parse_http_date(value):
+    """Returns the timestamp for an HTTP date or None if it can't be parsed"""
+    if not value:
+        return None
+
+    # Some browsers append '; length=xxx' to If-Modified-Since
+    parsed = parsedate_tz(value.split(';')[0])
+    if parsed is None:
+        return None
+
+    return mktime_tz(parsed)
+
+def run_concurrently(funcs, max_workers):
+    """Calls every function in funcs using at most max_workers threads and
+    returns their results in the same order. If any of them raises, the
+    first exception is raised again after every thread finishes"""
+    if max_workers <= 1 or len(funcs) <= 1:
+        return [func() for func in funcs]
+
+    results = [None] * len(funcs)
+    errors = []
+    pending = Queue()
+    for index in range(len(funcs)):
+        pending.put(index)
+
+    def worker():
+        from django.db import connection
+        try:
+            while True:
+                try:
+                    index = pending.get_nowait()
+                except Empty:
+                    return
+                try:
+                    results[index] = funcs[index]()
+                except:
+                    errors.append(sys.exc_info())
+        finally:
+            # Every thread gets its own database connection
+            connection.close()
+
+    threads = [threading.Thread(target=worker) for i in \
+        range(min(max_workers, len(funcs)))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    if errors:
+        raise errors[0][0], errors[0][1], errors[0][2]
+
+    return results
+
+def is_fieldset_param(name):
+    """Wheter name is one of the parameters parsed by parse_fieldsets"""
+    return name == 'fields' or FIELDSET_RE.match(name) is not None
+
+def parse_fieldsets(dct):
+    """Returns the fieldsets requested with the 'fields' and 'fields[name]'
+    parameters, as a dict mapping object names to the sets of requested
+    keys. 'fields' applies to the top-level objects and is stored with the
+    None key. Returns None if no fieldsets were requested"""
+    fieldsets = {}
+    for key in dct.keys():
+        if not is_fieldset_param(key):
+            continue
+        if key == 'fields':
+            name = None
+        else:
+            name = FIELDSET_RE.match(key).group(1)
+
+        value = dct[key]
+        if isinstance(value, basestring):
+            fieldsets[name] = set([field.strip() for field in \
+                value.split(',') if field.strip()])
+
+    return fieldsets or None
+
+def constant_time_compare(val1, val2):
+    """Compares two strings taking the same time whenever they have the
+    same length, so signatures can't be guessed byte by byte"""
+    if len(val1) != len(val2):
+        return False
+
+    result = 0
+    for x, y in zip(val1, val2):
+        result |= ord(x) ^ ord(y)
+    return result == 0
+
+def get_signature(value, salt=''):
+    """Returns an HMAC of value keyed with salt and the SECRET_KEY"""
+    from django.conf import settings
+    return hmac.new(salt + settings.SECRET_KEY, value, hashlib.sha1).hexdigest()
+
+def sign(value, salt=''):
+    """Appends a signature to the given string"""
+    return '%s:%s' % (value, get_signature(value, salt))
+
+def unsign(signed, salt=''):
+    """Returns the value signed with sign, raising ValueError if
+    the signature doesn't match"""
+    value, sep, signature = signed.rpartition(':')
+    if not sep or not constant_time_compare(signature,
+        get_signature(value, salt)):
+        raise ValueError('Bad signature')
+
+    return value
+
+def close_connection_after(iterator):
+    """Returns an iterator equivalent to the given one which closes the
+    database connection when it's exhausted or closed after the request
+    has finished. Django 1.0 and 1.1 close the connection when the view
+    returns, before the content of a streamed response is consumed, so
+    the queries made while streaming would leave their connection open
+    otherwise. Content read while the request is being processed (e.g.
+    by batch or cache_response) must not close it, since it could roll
+    back uncommitted writes"""
+    from django.core.signals import request_finished
+    thread = threading.currentThread()
+    finished = []
+
+    def request_finished_handler(sender, **kwargs):
+        # Signals are global, only the thread serving the request counts
+        if threading.currentThread() is thread:
+            finished.append(True)
+            request_finished.disconnect(request_finished_handler)
+
+    request_finished.connect(request_finished_handler, weak=False)
+    return _close_connection_after(iterator, finished,
+        request_finished_handler)
+
+def _close_connection_after(iterator, finished, request_finished_handler):
+    from django.core.signals import request_finished
+    from django.db import connection
+    try:
+        for item in iterator:
+            yield item
+    finally:
+        request_finished.disconnect(request_finished_handler)
+        close = getattr(iterator, 'close', None)
+        if close is not None:
+            close()
+        if finished:
+            connection.close()
+
+def prime(iterator):
+    """Advances iterator to its first item, so the code before the first
+    yield in a generator runs now, and returns an equivalent iterator"""
+    try:
+        first = iterator.next()
+    except StopIteration:
+        return iter(())
+
+    return chain([first], iterator)
@@ -21,11 +21,13 @@
 # THE SOFTWARE.
 
 import re
+from array import array
 
 from django.forms import ValidationError
 from django.utils.translation import ugettext_lazy, ugettext as _
 
 ALPHA_NUMERIC_RE = re.compile('\w+')
+ALPHA_NUMERIC_ONLY_RE = re.compile(r'^\w+$')
 
 class Validator(object):
     """Base class for all the Wapi validators"""
@@ -112,9 +114,7 @@ class UnicodeValidator(StringValidator):
 class AlphaNumericValidator(Validator):
     """Validates that the given value is an alphanumeric string"""
     def validate(self, value):
-        import re
-        alnum_re = re.compile(r'^\w+$')
-        if not alnum_re.search(value):
+        if not ALPHA_NUMERIC_ONLY_RE.search(value):
             raise ValidationError, _("This value must contain only letters, numbers and underscores.")
         return value
 
@@ -150,9 +150,10 @@ class CommaSeparatedIntegersValidator(Validator):
         self.integer_validator = IntegerValidator()
 
     def validate(self, value):
-        values = []
-        for val in value.split(','):
-            values.append(self.integer_validator.validate(val))
+        try:
+            values = map(int, value.split(','))
+        except (ValueError, TypeError):
+            raise ValidationError(_('Not an integer'))
 
         if self.keep:
             return value
@@ -160,6 +161,95 @@ class CommaSeparatedIntegersValidator(Validator):
         return values
 
 
+class ID(int):
+    """Item type for list parameters containing object ids, which must
+    be positive integers"""
+    pass
+
+
+class ListValidator(Validator):
+    """Validates a list of values, given as a comma separated string or
+    as a list of them (one per repeated parameter). Returns a tuple, or an
+    array when typecode is set"""
+    DOC_NAMES = {
+        'max_count': ugettext_lazy('Maximum number of items'),
+    }
+    typecode = None
+    separator = ','
+    def __init__(self, *args, **kwargs):
+        super(ListValidator, self).__init__()
+        self.max_count = kwargs.get('max_count')
+
+    def convert(self, items):
+        """Converts the list of strings, raising ValidationError if
+        any of them is invalid"""
+        return tuple(items)
+
+    def validate(self, value):
+        if not isinstance(value, basestring):
+            value = self.separator.join([v for v in value if v])
+
+        # Check the count before splitting and converting the items
+        if self.max_count is not None and \
+            value.count(self.separator) >= self.max_count:
+            raise ValidationError(_('Too many items (max is %d)') % \
+                self.max_count)
+
+        if not value:
+            items = []
+        else:
+            items = value.split(self.separator)
+        values = self.convert(items)
+        if self.typecode:
+            return array(self.typecode, values)
+        return values
+
+
+class IntegerListValidator(ListValidator):
+    """Validates a list of integers"""
+    typecode = 'l'
+    def convert(self, items):
+        try:
+            return map(int, items)
+        except (ValueError, TypeError):
+            raise ValidationError(_('Not a list of integers'))
+
+    def validate(self, value):
+        try:
+            return super(IntegerListValidator, self).validate(value)
+        except OverflowError:
+            raise ValidationError(_('Not a list of integers'))
+
+
+class IDListValidator(IntegerListValidator):
+    """Validates a list of object ids"""
+    def convert(self, items):
+        values = super(IDListValidator, self).convert(items)
+        if values and min(values) <= 0:
+            raise ValidationError(_('Not a list of ids'))
+        return values
+
+
+class FloatListValidator(ListValidator):
+    """Validates a list of floats"""
+    typecode = 'd'
+    def convert(self, items):
+        try:
+            return map(float, items)
+        except (ValueError, TypeError):
+            raise ValidationError(_('Not a list of floats'))
+
+
+class UnicodeListValidator(ListValidator):
+    """Validates a list of unicode strings"""
+    def convert(self, items):
+        try:
+            return tuple([unicode(item, 'utf8') \
+                if not isinstance(item, unicode) else item for item in items])
+        except UnicodeError:
+            raise ValidationError(_('Invalid unicode'))
+
+
 class ChoiceValidator(Validator):
     """Validates that the given value is one of the provided choices"""
     def __init__(self, *args, **kwargs):
@@ -234,6 +324,15 @@ TYPE_VALIDATORS = {
     file: None,
 }
 
+LIST_VALIDATORS = {
+    int: IntegerListValidator,
+    float: FloatListValidator,
+    str: ListValidator,
+    basestring: ListValidator,
+    unicode: UnicodeListValidator,
+    ID: IDListValidator,
+}
+
 def validate_type(value_type, value):
     """Validates a value given its type"""
     try:
@@ -248,3 +347,9 @@ def get_type_validator(value_type):
     except KeyError:
         return None
 
+def get_list_validator(item_type):
+    """Returns the list validator for the given item type"""
+    try:
+        return LIST_VALIDATORS[item_type]
+    except KeyError:
+        return None